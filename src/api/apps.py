@@ -22,6 +22,9 @@ class ApiConfig(AppConfig):
         from onit.constants import EMPTY_QUERYSET
         # EMPTY_QUERYSET = Session.objects.none()
 
+        # Evict the cached responses of changed tables
+        from api import signals
+
         from services.configuration import ConfigurationService
         from services.database import DatabaseService
         from services.rest import RestService
@@ -34,4 +37,7 @@ class ApiConfig(AppConfig):
         # ApiConfig.database.initialize()
 
         # Load RestService configuration
-        RestService.get_control_parameters()
\ No newline at end of file
+        RestService.get_control_parameters()
+
+        # The query path plans are built by the boot phase (onit/boot.py), or
+        # per pair on first use: management commands don't need them
\ No newline at end of file
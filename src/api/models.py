@@ -4,7 +4,7 @@ Data models for On It Website API
 
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.core.serializers.json import DjangoJSONEncoder
 
 
@@ -183,6 +183,7 @@ class MediaAsset(models.Model):
     height = models.IntegerField(null=True, blank=True)
     created_date = models.DateField(auto_now_add=True)
     category = models.CharField(max_length=255)
+    entityfeatures = GenericRelation("EntityFeature", related_query_name="media_asset")
 
     def __str__(self) -> str:
         return str(self.label)
@@ -208,6 +209,7 @@ class Service(models.Model):
     featured = models.BooleanField(default=False)
     inforce = models.BooleanField(default=False)
     last_update = models.DateTimeField(auto_now=True, null=True, blank=True)
+    entitymedia = GenericRelation("EntityMedia", related_query_name="service")
 
     def save(self, *args, **kwargs):
         """
@@ -222,6 +224,9 @@ class Service(models.Model):
             if previous_inforce != self.inforce:
                 Page.objects.filter(title=self.label).update(
                     active=self.inforce)
+                # A queryset update sends no signal: evict the cached pages here
+                from services.cache.cache import CacheService
+                CacheService.invalidate_on_commit(["Page"])
 
         super().save(*args, **kwargs)
 
@@ -257,6 +262,7 @@ class ServiceMethod(models.Model):
         on_delete=models.CASCADE,
         related_name="targets"
     )
+    entitymedia = GenericRelation("EntityMedia", related_query_name="service_method")
 
     def __str__(self) -> str:
         return str(self.label)
@@ -283,6 +289,7 @@ class Office(models.Model):
     phone = models.CharField(max_length=24, null=True, blank=True)
     head = models.CharField(max_length=255)
     headoffice = models.BooleanField(default=False)
+    entitymedia = GenericRelation("EntityMedia", related_query_name="office")
 
     def __str__(self) -> str:
         return str(self.label)
@@ -459,6 +466,7 @@ class Enquiry(models.Model):
     website = models.CharField(max_length=128, null=True, blank=True)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    entityfeatures = GenericRelation("EntityFeature", related_query_name="enquiry")
 
     def save(self, *args, **kwargs):
         """
@@ -565,6 +573,7 @@ class Employee(models.Model):
         db_index=True,
         related_name="employees"
     )
+    entitymedia = GenericRelation("EntityMedia", related_query_name="employee")
 
     def __str__(self) -> str:
         return str(self.person)
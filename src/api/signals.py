@@ -0,0 +1,23 @@
+"""
+api/signals.py
+Keeping the cached responses in step with the models
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from services.cache.cache import CacheService
+
+
+@receiver([post_save, post_delete], dispatch_uid="api.invalidate_cached_responses")
+def invalidate_cached_responses(sender, **kwargs):
+    """
+    Evicts the cached responses read from the table of a saved or deleted
+    record, once the change is committed. Bulk creates and updates don't send
+    these signals: the bulk operations of Table invalidate their table.
+    """
+    if sender._meta.app_label != "api":
+        return
+
+    table_name = sender._meta.object_name
+    CacheService.invalidate_on_commit([table_name])
@@ -1,3 +1,1207 @@
-from django.test import TestCase
+import gc
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache, caches
+from django.db import connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from unittest import mock, skipUnless
+
+from api.models import (
+    Employee, Enquiry, EntityFeature, EntityMedia, Feature, FunctionalArea, MediaAsset, Page,
+    Person, ReportingStructure, Role, Service
+)
+from components.dataclasses import EncodedResponse
+from components.graphs import Graph
+from components.processors import Query
+from components.sources.databases.database import PostgreSQLDatabase
+from components.sources.databases.database_source import RelationalDatabaseSource
+from libs.algorithms import a_star
+from libs.memory import deep_sizeof
+from libs.querysets import QuerysetRegistry
+from libs.tracing import span, trace
+from onit.boot import boot
+from services.cache.cache import CacheService
+from services.cache.dependencies import CacheDependencies
+from services.cache.metrics import CacheMetrics
+from services.cache.object_cache import ObjectCache
+from services.cache.snapshot import CacheSnapshot
+from services.cache.tiered_cache import TieredCache
+from services.cache.warmup import CacheWarmer
+from services.data import DataService
+from services.database import DatabaseService
+from services.processing import TransformationService
+from services.query_budget import QueryBudgetExceeded, QueryBudgetService
+from services.rest import RestService
+
+
+def resident_memory() -> int:
+    """Returns the resident set size of the process in bytes (Linux)"""
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def plan_depth(plan: dict) -> int:
+    """Returns the depth of a node of a PostgreSQL EXPLAIN (FORMAT JSON) plan"""
+    return 1 + max((plan_depth(child) for child in plan.get("Plans", [])), default=0)
+
+
+class CompiledPathTest(TestCase):
+    """Compiled path execution against segment by segment execution"""
+
+    @classmethod
+    def setUpTestData(cls):
+        service_type = ContentType.objects.get_for_model(Service)
+
+        for i in range(3):
+            service = Service.objects.create(
+                key=f"service-{i}",
+                label=f"Service {i}",
+                path=f"/services/{i}",
+                featured=i == 0,
+                inforce=True
+            )
+            media_asset = MediaAsset.objects.create(
+                key=f"media-asset-{i}",
+                label=f"Media asset {i}",
+                format="png",
+                category="icon"
+            )
+            EntityMedia.objects.create(
+                media_asset=media_asset,
+                content_type=service_type,
+                object_id=service.pk
+            )
+
+    def setUp(self):
+        self.source = DataService.get_source("Database:Default")
+        self.segments = self.source.get_path_plan("Service", "MediaAsset")
+        self.query = Query.get_builder().fit({"featured": "true"})
+
+    def test_compiled_path_matches_segments(self):
+        stepwise = self.source.execute_path("Service", self.segments, self.query, "test:stepwise")
+        compiled = self.source.compile_path(self.segments, self.query, "test:compiled")
+
+        self.assertIsNotNone(compiled)
+        self.assertEqual(
+            set(compiled.values_list("key", flat=True)),
+            set(stepwise.values_list("key", flat=True))
+        )
+        self.assertEqual(set(compiled.values_list("key", flat=True)), {"media-asset-0"})
+
+    def test_compiled_path_is_one_flat_query(self):
+        stepwise = self.source.execute_path("Service", self.segments, self.query, "test:stepwise")
+        compiled = self.source.compile_path(self.segments, self.query, "test:compiled")
+
+        self.assertEqual(str(compiled.query).count("SELECT"), 1)
+        self.assertGreater(str(stepwise.query).count("SELECT"), 1)
+
+        with self.assertNumQueries(1):
+            list(compiled)
+
+        stepwise_plan = json.loads(stepwise.explain(format="json"))[0]["Plan"]
+        compiled_plan = json.loads(compiled.explain(format="json"))[0]["Plan"]
+        self.assertLess(plan_depth(compiled_plan), plan_depth(stepwise_plan))
+
+    def test_deleting_an_entity_deletes_its_links(self):
+        # The GenericRelation fields cascade to the link rows, not to the linked rows
+        media_asset = MediaAsset.objects.get(key="media-asset-0")
+        feature = Feature.objects.create(key="featured", label="Featured", slug="featured")
+        EntityFeature.objects.create(feature=feature, content_object=media_asset)
+
+        Service.objects.get(key="service-0").delete()
+        self.assertFalse(EntityMedia.objects.filter(media_asset=media_asset).exists())
+        self.assertEqual(EntityMedia.objects.count(), 2)
+
+        media_asset.delete()
+        self.assertFalse(EntityFeature.objects.exists())
+        self.assertTrue(Feature.objects.filter(pk=feature.pk).exists())
+
+    def test_a_registered_empty_queryset_is_reused(self):
+        table = DatabaseService.get_database().get(model_name="Service")
+        QuerysetRegistry.open("test:empty")
+        self.addCleanup(QuerysetRegistry.release, "test:empty")
+        self.addCleanup(CacheDependencies.release, "test:empty")
+
+        empty = table.filter({"key": "missing"}, "test:empty")
+
+        # An empty result of the request stands: the table is not filtered again
+        with self.assertNumQueries(0):
+            self.assertIs(table.filter({"featured": True}, "test:empty"), empty)
+        self.assertFalse(empty.exists())
+
+
+class PathPlanTest(TestCase):
+    """Every pair of the schema can be planned once the app is ready"""
+
+    def setUp(self):
+        self.source = RelationalDatabaseSource()
+
+    def test_app_boots_and_plans_every_pair(self):
+        apps.get_app_config("api").ready()
+
+        schema = self.source.database.schema
+        self.assertEqual(len(self.source.plan_paths()), len(schema) ** 2)
+
+    def test_intermediate_endpoints_face_their_neighbour(self):
+        # Paths run from the target back to the source
+        *_, from_intermediate = self.source.get_path_plan("EntityMedia", "Service")
+        self.assertIsNone(from_intermediate.predecessor)
+        self.assertEqual(from_intermediate.successor.name, "Service")
+
+        to_intermediate, *_ = self.source.get_path_plan("Service", "EntityMedia")
+        self.assertEqual(to_intermediate.predecessor.name, "Service")
+        self.assertIsNone(to_intermediate.successor)
+
+    def test_plans_follow_the_original_search(self):
+        graph = Graph()
+        for table_name, value in self.source.database.schema.items():
+            graph.add_node(table_name, value)
+
+        for (source, target), segments in self.source.plan_paths().items():
+            graph.reset()
+            expected = [node.name for node in a_star(graph, source, target)]
+            self.assertEqual([node.name for node in segments[0].path], expected, f"{source} to {target}")
+
+        # Neighbours are searched in schema order, whatever the hash seed
+        path = self.source.get_path_plan("EntityFeature", "Employee")[0].path
+        self.assertEqual([node.name for node in path], ["Employee", "EntityMedia", "MediaAsset", "EntityFeature"])
+
+    def test_unknown_pairs_are_invalid(self):
+        with self.assertRaises(ValueError):
+            self.source.get_path_plan("Service", "Unknown")
+
+        response = self.client.get("/cb/", {"select": "Service-Unknown"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("No path from 'Unknown' to 'Service'", response.json()["message"])
+
+
+class RequestContextTest(SimpleTestCase):
+    """Lifecycle of the request context"""
+
+    def test_request_is_released_with_the_response(self):
+        request = RequestFactory().get("/cb/", {"select": "Page", "menu": "header", "with_context": "header"})
+
+        with RestService.open_request(request) as request_context:
+            self.assertIs(request_context.request, request)
+            self.assertEqual(request_context.parsed.command, "select")
+            self.assertEqual(request_context.parsed.target, "Page")
+            self.assertEqual(request_context.parsed.query_parameters, (("menu", "header"),))
+            self.assertEqual(request_context.parsed.endpoint_context, "header")
+
+        self.assertIsNone(request_context.request)
+
+    def test_request_is_parsed_once(self):
+        request = RequestFactory().get("/cb/", {"select": "MediaAsset-Service", "featured": "true", "label": "except:Old"})
+        parsed = RestService.parse_request(request)
+
+        self.assertEqual(parsed.targets, ("MediaAsset", "Service"))
+        self.assertEqual((parsed.target, parsed.source), ("MediaAsset", "Service"))
+        self.assertEqual(parsed.filters, {"include": {"featured": True}, "exclude": {"label__exact": "Old"}})
+
+        with self.assertRaises(AttributeError):
+            parsed.command = "insert"
+
+    def test_cache_key_ignores_parameter_order(self):
+        factory = RequestFactory()
+        first = RestService.parse_request(factory.get("/cb/?select=Service&featured=true&label=contains:web"))
+        second = RestService.parse_request(factory.get("/cb/?select=Service&label=contains:web&featured=true"))
+        other = RestService.parse_request(factory.get("/cb/?select=Service&featured=false&label=contains:web"))
+
+        self.assertEqual(first.cache_key, second.cache_key)
+        self.assertNotEqual(first.cache_key, other.cache_key)
+
+    def test_cache_key_ignores_tracking_parameters(self):
+        factory = RequestFactory()
+        plain = RestService.parse_request(factory.get("/cb/?select=Service&featured=true"))
+        tracked = RestService.parse_request(
+            factory.get("/cb/?utm_source=mail&select=Service&featured=true&utm_campaign=launch&_=1700000000")
+        )
+
+        self.assertEqual(tracked.command, "select")
+        self.assertEqual(tracked.query_parameters, (("featured", "true"),))
+        self.assertEqual(plain.cache_key, tracked.cache_key)
+
+    def test_canonical_path_parses_to_the_same_request(self):
+        factory = RequestFactory()
+        parsed = RestService.parse_request(
+            factory.get("/cb/?select=MediaAsset-Service&with_context=header&label=contains:web&featured=true")
+        )
+        path, _, query = parsed.canonical_path.partition("?")
+
+        self.assertEqual(RestService.parse_request(factory.get(f"{path}?{query}")).cache_key, parsed.cache_key)
+
+    def test_distinct_urls_do_not_grow_memory(self):
+        factory = RequestFactory()
+
+        def replay(start, count):
+            for i in range(start, start + count):
+                request = factory.get("/cb/", {"select": "Service", "id": i})
+                with RestService.open_request(request) as request_context:
+                    RestService.get_view(request_context)
+
+        tracemalloc.start()
+        try:
+            replay(0, 1_000)
+            gc.collect()
+            baseline, _ = tracemalloc.get_traced_memory()
+
+            replay(1_000, 100_000)
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertLess(current - baseline, 1024 * 1024)
+
+
+class EncodedResponseTest(SimpleTestCase):
+    """Responses are encoded once and served from the encoded bytes"""
+
+    def test_encoded_body_is_the_response_envelope(self):
+        request = RequestFactory().get("/cb/", {"select": "Service", "featured": "true"})
+        data = [{"id": 1, "label": "Web design"}]
+
+        with RestService.open_request(request) as request_context:
+            encoded = RestService.encode_response(request_context, data)
+            response = RestService.encoded_response(encoded)
+
+        envelope = json.loads(encoded.body)
+        self.assertEqual(envelope["data"], data)
+        self.assertEqual(envelope["results"], 1)
+        self.assertEqual(envelope["query parameters"], {"featured": "true"})
+        self.assertEqual(envelope["size (bytes)"], len(json.dumps(data)))
+
+        self.assertEqual(response.content, encoded.body)
+        self.assertEqual(response["ETag"], encoded.etag)
+        self.assertGreater(sys.getsizeof(encoded), len(encoded.body))
+
+    def test_conditional_requests_get_not_modified(self):
+        factory = RequestFactory()
+        request = factory.get("/cb/", {"select": "Service"})
+
+        with RestService.open_request(request) as request_context:
+            encoded = RestService.encode_response(request_context, [{"id": 1}])
+
+        # The response was cached (and its data last changed) at the time it was encoded
+        encoded = EncodedResponse(
+            body=encoded.body, etag=encoded.etag, created_at=datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+        )
+
+        cases = [
+            ({"HTTP_IF_NONE_MATCH": encoded.etag}, 304),
+            ({"HTTP_IF_NONE_MATCH": '"stale"'}, 200),
+            ({"HTTP_IF_MODIFIED_SINCE": "Thu, 01 Jan 2026 00:00:00 GMT"}, 304),
+            ({"HTTP_IF_MODIFIED_SINCE": "Wed, 31 Dec 2025 00:00:00 GMT"}, 200),
+        ]
+        for headers, status in cases:
+            request = factory.get("/cb/", {"select": "Service"}, **headers)
+            with RestService.open_request(request) as request_context:
+                response = RestService.conditional_response(request_context, encoded)
+
+            self.assertEqual(response.status_code, status, headers)
+            self.assertEqual(response["ETag"], encoded.etag)
+            self.assertEqual(response["Last-Modified"], "Thu, 01 Jan 2026 00:00:00 GMT")
+
+
+class ObjectCacheTest(SimpleTestCase):
+    """Eviction and expiry of the object cache"""
+
+    def make_cache(self, policy):
+        object_cache = ObjectCache()
+        object_cache.configure(timeout=60, storage_threshold=10 ** 9, policy=policy, sweep_interval=0)
+        for key in "abcd":
+            object_cache.set(key, key * 100)
+
+        return object_cache
+
+    def evict_one(self, object_cache):
+        object_cache.storage_threshold = object_cache.storage - 1
+        object_cache.remove_oldest_objects()
+
+    def test_lru_evicts_the_least_recently_used(self):
+        object_cache = self.make_cache("LRU")
+        object_cache.get("a")
+        self.evict_one(object_cache)
+
+        self.assertIsNone(object_cache.get("b"))
+        self.assertEqual(object_cache.get("a"), "a" * 100)
+
+    def test_lfu_evicts_the_least_frequently_used(self):
+        object_cache = self.make_cache("LFU")
+        for key in "abc":
+            object_cache.get(key)
+        object_cache.get("a")
+        self.evict_one(object_cache)
+
+        self.assertIsNone(object_cache.get("d"))
+        self.assertEqual(object_cache.get("b"), "b" * 100)
+
+    def test_expired_objects_are_dropped(self):
+        object_cache = self.make_cache("LRU")
+        object_cache.set("short", "value", timeout=0.01)
+        object_cache.set("swept", "value", timeout=0.01)
+        time.sleep(0.02)
+
+        self.assertIsNone(object_cache.get("short"))
+
+        object_cache.configure(sweep_interval=1)
+        object_cache.remove_expired_objects()
+        self.assertFalse(object_cache.has_key("swept"))
+        self.assertEqual(object_cache.storage, sum(sys.getsizeof(key * 100) for key in "abcd"))
+
+    def test_objects_are_booked_at_their_deep_size(self):
+        pages = [{"id": i, "title": f"Page {i}", "path": f"/pages/{i}", "active": True} for i in range(5_000)]
+
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            copy = json.loads(json.dumps(pages))
+            allocated = tracemalloc.get_traced_memory()[0] - baseline
+        finally:
+            tracemalloc.stop()
+
+        self.assertAlmostEqual(deep_sizeof(copy) / allocated, 1, delta=0.2)
+        self.assertEqual(ObjectCache.estimate_size(copy), deep_sizeof(copy))
+
+    def test_metrics_count_hits_misses_and_evictions(self):
+        object_cache = self.make_cache("LRU")
+        object_cache.set("select:Service:1", "value")
+        object_cache.get("select:Service:1")
+        object_cache.get("select:Service:2")
+        object_cache.delete("a")
+        self.evict_one(object_cache)
+
+        metrics = object_cache.metrics
+        self.assertEqual((metrics.hits, metrics.misses, metrics.sets), (1, 1, 5))
+        self.assertEqual(metrics.evictions, {"deleted": 1, "capacity": 1})
+
+        output = CacheMetrics.render(object_cache.get_metrics({"worker": 1}))
+        self.assertIn("# TYPE onit_cache_hits_total counter", output)
+        self.assertIn('onit_cache_evictions_total{tier="l1",worker="1",reason="capacity"} 1', output)
+        self.assertIn('onit_cache_prefix_hit_ratio{tier="l1",worker="1",prefix="select:Service"} 0.5', output)
+        self.assertIn(f'onit_cache_entries{{tier="l1",worker="1"}} {len(object_cache._entries)}', output)
+
+    @skipUnless(os.path.exists("/proc/self/statm"), "Resident memory is read from /proc")
+    def test_resident_memory_stays_near_the_budget(self):
+        budget = 16 * 1024 * 1024
+        object_cache = ObjectCache()
+        object_cache.configure(timeout=60, storage_threshold=budget, policy="LRU", sweep_interval=0)
+
+        gc.collect()
+        baseline = resident_memory()
+
+        # 100 payloads of ~3 MB each: ~20 times the budget
+        for key in range(100):
+            object_cache.set(key, [
+                {"id": i, "title": f"Page {key}-{i}", "path": f"/pages/{key}/{i}", "active": True}
+                for i in range(5_000)
+            ])
+
+        gc.collect()
+        self.assertLessEqual(object_cache.storage, budget)
+        self.assertLess(resident_memory() - baseline, 2 * budget)
+
+
+@skipUnless(os.environ.get("REDIS_URL"), "Needs a Redis server (REDIS_URL)")
+class TieredCacheTest(SimpleTestCase):
+    """A worker sharing the Redis tier with another worker"""
+
+    def setUp(self):
+        import redis
+
+        params = {"OPTIONS": {"PREFIX": f"onit:test:{os.getpid()}:cache"}}
+        self.worker = TieredCache(os.environ["REDIS_URL"], params)
+        self.encoded = EncodedResponse(body=b'{"data": []}', etag='"etag"')
+
+        # The other worker: another process, played with a plain client
+        self.other = redis.Redis.from_url(os.environ["REDIS_URL"])
+        self.assertIsNotNone(self.worker.client)
+        self.assertTrue(self.wait_for(lambda: self.other.pubsub_numsub(self.worker.channel)[0][1] > 0))
+
+    def tearDown(self):
+        self.worker.clear()
+        self.other.close()
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        return condition()
+
+    def fill_by_the_other_worker(self, key, tables=()):
+        payload = pickle.dumps((self.encoded, 60), pickle.HIGHEST_PROTOCOL)
+        self.other.set(self.worker._key(key), payload, ex=60)
+        for table_name in tables:
+            self.other.sadd(self.worker._table_key(table_name), key)
+
+    def test_responses_are_shared_and_invalidated_together(self):
+        self.fill_by_the_other_worker("key")
+
+        self.assertEqual(self.worker.get("key"), self.encoded)
+        self.assertEqual(self.worker.local.get("key"), self.encoded)
+
+        self.other.delete(self.worker._key("key"))
+        self.other.publish(self.worker.channel, "other:key:key")
+        self.assertTrue(self.wait_for(lambda: self.worker.local.get("key") is None))
+        self.assertIsNone(self.worker.get("key"))
+
+    def test_the_threads_share_one_client_and_listener(self):
+        instance = TieredCache(os.environ["REDIS_URL"], {"OPTIONS": {"PREFIX": self.worker.prefix}})
+
+        self.assertIs(instance.local, self.worker.local)
+        self.assertIs(instance.client, self.worker.client)
+        self.assertEqual(self.other.pubsub_numsub(self.worker.channel)[0][1], 1)
+
+    def test_table_changes_evict_the_responses_of_every_worker(self):
+        # Filled by the other worker: this one has no index of its own
+        self.fill_by_the_other_worker("key", tables=["Service"])
+        self.assertEqual(self.worker.get("key"), self.encoded)
+        CacheDependencies.clear()
+
+        pubsub = self.other.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.worker.channel)
+        self.addCleanup(pubsub.close)
+        self.assertTrue(self.wait_for(lambda: self.other.pubsub_numsub(self.worker.channel)[0][1] > 1))
+
+        self.worker.invalidate_tables(["Service"])
+
+        self.assertIsNone(self.other.get(self.worker._key("key")))
+        self.assertIsNone(self.worker.local.get("key"))
+        messages = []
+        self.assertTrue(self.wait_for(lambda: messages.append(pubsub.get_message()) or any(messages)))
+        message = next(message for message in messages if message)
+        self.assertTrue(message["data"].decode("utf-8").endswith(":tables:Service:key"))
+
+    def test_one_worker_fills_a_key_at_a_time(self):
+        filled = threading.Event()
+
+        def fill():
+            with self.worker.lock("key"):
+                filled.set()
+                time.sleep(0.2)
+                self.worker.set("key", self.encoded)
+
+        filler = threading.Thread(target=fill)
+        filler.start()
+        filled.wait()
+
+        # The Redis lock holds the key across the threads and the workers
+        with self.worker.lock("key"):
+            self.assertEqual(self.worker.get("key"), self.encoded)
+
+        filler.join()
+
+
+class CacheInvalidationTest(TestCase):
+    """Changes to a table evict the cached responses read from it"""
+
+    def setUp(self):
+        CacheService.clear_object_cache()
+        self.factory = RequestFactory()
+
+    def get(self, query):
+        request = self.factory.get("/cb/", query)
+        with RestService.open_request(request) as request_context:
+            return RestService.get_view(request_context)(request_context), request_context.key
+
+    def test_saving_a_record_evicts_only_dependent_responses(self):
+        Service.objects.create(key="web", label="Web", path="/web", featured=True, inforce=True)
+        MediaAsset.objects.create(key="logo", label="Logo", format="png", category="icon")
+
+        _, service_key = self.get({"select": "Service"})
+        _, media_key = self.get({"select": "MediaAsset"})
+        self.assertIn("Service", CacheDependencies.get_tables(service_key))
+        self.assertIsNotNone(CacheService.get_object(service_key))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.filter(key="web").first().save()
+
+        self.assertIsNone(CacheService.get_object(service_key))
+        self.assertIsNotNone(CacheService.get_object(media_key))
+
+    def test_deactivating_a_service_evicts_its_pages(self):
+        service = Service.objects.create(key="web", label="Web", path="/web", inforce=True)
+        Page.objects.create(title="Web", path="/web", menu="header")
+
+        _, page_key = self.get({"select": "Page"})
+        self.assertIsNotNone(CacheService.get_object(page_key))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            service.inforce = False
+            service.save()
+
+        # The pages are updated without a signal, but their responses are evicted all the same
+        self.assertIsNone(CacheService.get_object(page_key))
+        self.assertFalse(Page.objects.get(title="Web").active)
+
+    def test_a_table_changed_during_a_fill_is_not_cached(self):
+        def fill():
+            CacheDependencies.touch("key", "Service")
+            # Another request changes the table after the rows were read
+            CacheService.invalidate_tables(["Service"])
+            return EncodedResponse(body=b"{}", etag='"old"'), 60
+
+        item = CacheService.get_or_fill("key", fill)
+
+        # The request still gets its response, but the next one reads the table again
+        self.assertEqual(item.etag, '"old"')
+        self.assertIsNone(CacheService.get_object("key"))
+        self.assertEqual(CacheDependencies.get_tables("key"), set())
+
+        def unchanged_fill():
+            CacheDependencies.touch("key", "Service")
+            return EncodedResponse(body=b"{}", etag='"new"'), 60
+
+        CacheService.get_or_fill("key", unchanged_fill)
+        self.assertEqual(CacheService.get_object("key").etag, '"new"')
+
+
+class CacheFillTest(SimpleTestCase):
+    """Coalesced fills and stale-while-revalidate"""
+
+    def setUp(self):
+        CacheService.clear_object_cache()
+        self.fills = 0
+
+    def slow_fill(self, value=b"{}", error=None):
+        def fill():
+            self.fills += 1
+            time.sleep(0.1)
+            if error:
+                raise error
+            return EncodedResponse(body=value, etag='"etag"'), 60
+
+        return fill
+
+    def fill_concurrently(self, fill, requests=8):
+        results = []
+
+        def request():
+            try:
+                results.append(CacheService.get_or_fill("key", fill))
+            except Exception as error:
+                results.append(error)
+
+        threads = [threading.Thread(target=request) for _ in range(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def test_concurrent_misses_fill_once(self):
+        results = self.fill_concurrently(self.slow_fill())
+
+        self.assertEqual(self.fills, 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    def test_fill_errors_reach_the_waiters(self):
+        results = self.fill_concurrently(self.slow_fill(error=ValueError("unavailable")))
+
+        self.assertEqual(self.fills, 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertIsNone(CacheService.get_object("key"))
+
+    def test_every_thread_shares_the_l1(self):
+        thread_caches = []
+        thread = threading.Thread(target=lambda: thread_caches.append(caches["default"]))
+        thread.start()
+        thread.join()
+
+        # One backend instance per thread, over one L1
+        self.assertIsNot(thread_caches[0], caches["default"])
+        self.assertIs(thread_caches[0].local, caches["default"].local)
+
+    def test_stale_objects_are_served_while_refreshed(self):
+        stale = EncodedResponse(body=b"stale", etag='"stale"', created_at=0)
+        CacheService.set_object("key", stale)
+
+        # The readers are served the stale object from the L1 shared by the
+        # threads, while the refresh thread fills the fresh one into it
+        results = self.fill_concurrently(self.slow_fill(value=b"fresh"))
+        self.assertTrue(all(result is stale for result in results))
+
+        deadline = time.monotonic() + 2
+        while CacheService.get_object("key") is stale and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(CacheService.get_object("key").body, b"fresh")
+        self.assertEqual(self.fills, 1)
+
+
+class CacheWarmupTest(TestCase):
+    """Replaying the manifest fills the cache"""
+
+    def test_warm_up_fills_the_cache(self):
+        CacheService.clear_object_cache()
+        Service.objects.create(key="web", label="Web", path="/web", featured=True, inforce=True)
+
+        report = CacheWarmer.warm_up(["/cb/?select=Service&featured=true"])
+
+        self.assertEqual([entry["status"] for entry in report], [200])
+        key = RestService.parse_request(RequestFactory().get("/cb/?select=Service&featured=true")).cache_key
+        self.assertIsNotNone(CacheService.get_object(key))
+
+    def test_workers_merge_their_collected_paths(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(setattr, CacheWarmer, "collected_path", CacheWarmer.collected_path)
+        self.addCleanup(setattr, CacheWarmer, "_hits", CacheWarmer._hits)
+        CacheWarmer.collected_path = os.path.join(directory, "collected_manifest.json")
+
+        def save(run, hits):
+            CacheWarmer._hits = Counter(hits)
+            with mock.patch.dict(os.environ, {"CACHE_WARMUP_RUN": run}):
+                CacheWarmer.save_collected()
+
+            with open(CacheWarmer.collected_path) as file:
+                return json.load(file)["hits"]
+
+        save("first", {"/cb/?select=SocialPlatform": 2, "/cb/?select=Parameter": 1})
+        self.assertEqual(
+            save("first", {"/cb/?select=Parameter": 3}),
+            {"/cb/?select=Parameter": 4, "/cb/?select=SocialPlatform": 2}
+        )
+        self.assertEqual(CacheWarmer.get_manifest()[-2:], ["/cb/?select=Parameter", "/cb/?select=SocialPlatform"])
+
+        # The paths of a previous run are replaced
+        self.assertEqual(save("second", {"/cb/?select=Region": 1}), {"/cb/?select=Region": 1})
+
+
+class CacheSnapshotTest(SimpleTestCase):
+    """Responses survive a restart through the snapshot"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        self.settings_override = self.settings(
+            CACHE_SNAPSHOT=True, CACHE_SNAPSHOT_PATH=os.path.join(directory, "snapshot.sqlite3")
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.addCleanup(setattr, CacheSnapshot, "_pid", 0)
+
+        CacheSnapshot._pid = 0
+        CacheService.clear_object_cache()
+
+    def restart(self):
+        """Drops the in-memory cache and reopens the snapshot, as a new process would"""
+        cache.clear()
+        CacheDependencies.clear()
+        CacheSnapshot._pid = 0
+
+    def test_responses_are_restored_after_a_restart(self):
+        encoded = EncodedResponse(body=b'{"data": [1]}', etag='"etag"')
+        CacheDependencies.touch("key", "Service")
+        CacheService.set_object("key", encoded)
+        CacheSnapshot.flush(CacheService.get_object, CacheDependencies.get_tables)
+
+        self.restart()
+
+        restored = CacheService.get_or_fill("key", lambda: self.fail("The snapshot was not used"))
+        self.assertEqual(restored, encoded)
+        self.assertEqual(CacheDependencies.get_tables("key"), {"Service"})
+
+    def test_table_changes_and_versions_discard_responses(self):
+        for key, table_name in (("service", "Service"), ("page", "Page")):
+            CacheDependencies.touch(key, table_name)
+            CacheService.set_object(key, EncodedResponse(body=b"{}", etag='"etag"'))
+        CacheSnapshot.flush(CacheService.get_object, CacheDependencies.get_tables)
+
+        CacheService.invalidate_tables(["Service"])
+        self.assertIsNone(CacheSnapshot.restore("service", max_age=60))
+        self.assertIsNotNone(CacheSnapshot.restore("page", max_age=60))
+
+        with self.settings(CACHE_SNAPSHOT_VERSION="next"):
+            self.restart()
+            self.assertIsNone(CacheSnapshot.restore("page", max_age=60))
+
+
+class NegativeCacheTest(TestCase):
+    """Empty results are served from the cache"""
+
+    def setUp(self):
+        CacheService.clear_object_cache()
+
+    def get(self, query):
+        request = RequestFactory().get("/cb/", query)
+        with RestService.open_request(request) as request_context:
+            return RestService.get_view(request_context)(request_context)
+
+    def test_empty_results_are_cached_for_the_negative_timeout(self):
+        query = {"select": "Service", "label": "contains:nothing-matches"}
+        first = self.get(query)
+        self.assertEqual(json.loads(first.content)["results"], 0)
+
+        with self.assertNumQueries(0):
+            second = self.get(query)
+
+        self.assertEqual(second.content, first.content)
+
+    def test_explicit_timeouts_do_not_slide(self):
+        object_cache = ObjectCache()
+        object_cache.configure(timeout=60, storage_threshold=10 ** 6, policy="LRU", sweep_interval=0)
+        object_cache.set("negative", [], timeout=0.05)
+
+        time.sleep(0.03)
+        self.assertEqual(object_cache.get("negative", CacheService.MISSING), [])
+        time.sleep(0.03)
+        self.assertIs(object_cache.get("negative", CacheService.MISSING), CacheService.MISSING)
+
+
+class RequestTracingTest(TestCase):
+    """Time spent per stage of a request"""
+
+    def setUp(self):
+        CacheService.clear_object_cache()
+
+    def test_stages_are_reported_in_the_server_timing_header(self):
+        with self.settings(REQUEST_TRACING=True):
+            response = self.client.get("/cb/", {"select": "Service"})
+
+        metrics = {metric.split(";")[0]: metric for metric in response["Server-Timing"].split(", ")}
+        self.assertTrue({"total", "cache", "fill", "fetch", "path_plan", "Get-Service", "encode"} <= set(metrics))
+        self.assertRegex(metrics["fetch"], r'^fetch;dur=[0-9.]+;desc="[1-9][0-9]* queries"$')
+
+        with self.settings(REQUEST_TRACING=True):
+            cached = self.client.get("/cb/", {"select": "Service"})
+
+        self.assertNotIn("fetch", cached["Server-Timing"])
+        self.assertIn('total;dur=', cached["Server-Timing"])
+
+    def test_spans_are_only_recorded_within_a_trace(self):
+        with span("outside"):
+            pass
+
+        with trace() as request_trace:
+            for _ in range(3):
+                with span("stage"):
+                    pass
+
+        self.assertEqual(list(request_trace.spans), ["stage"])
+        self.assertEqual(request_trace.to_dict()["spans"]["stage"]["calls"], 3)
+
+    def test_requests_are_only_traced_when_reported(self):
+        disabled = {
+            "REQUEST_TRACING": False, "REQUEST_TRACING_LOG": False,
+            "QUERY_BUDGETS": False, "QUERY_BUDGET_STRICT": False,
+        }
+
+        with self.settings(**disabled), mock.patch("api.views.trace", wraps=trace) as traced:
+            response = self.client.get("/cb/", {"select": "Service"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+        traced.assert_not_called()
+
+        # The shapes of the queries are only counted for the budgets
+        timed = {**disabled, "REQUEST_TRACING": True}
+        with self.settings(**timed), mock.patch("api.views.trace", wraps=trace) as traced:
+            response = self.client.get("/cb/", {"select": "Service"})
+        self.assertIn("Server-Timing", response)
+        traced.assert_called_once_with(count_shapes=False)
+
+    def test_query_shapes_are_only_counted_on_demand(self):
+        with trace(count_shapes=False) as request_trace:
+            Service.objects.exists()
+
+        self.assertEqual(request_trace.queries, 1)
+        self.assertFalse(request_trace.shapes)
+
+
+class QueryBudgetTest(TestCase):
+    """Query budgets of the requests and N+1 detection"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # The database registry is built by the boot phase, not by the first request
+        DatabaseService.get_database().initialize_once()
+
+        # More rows than the repeat threshold, so that an N+1 overruns its budget
+        rows = QueryBudgetService.get_budgets()["repeat_threshold"] + 1
+        functional_area = FunctionalArea.objects.create(key="operations", label="Operations", code="OP")
+        feature = Feature.objects.create(key="featured", label="Featured", slug="featured")
+
+        for i in range(rows):
+            service = Service.objects.create(key=f"service-{i}", label=f"Service {i}", path=f"/services/{i}", inforce=True)
+            media_asset = MediaAsset.objects.create(key=f"asset-{i}", label=f"Asset {i}", format="png", category="icon")
+            EntityFeature.objects.create(feature=feature, content_object=service)
+            EntityFeature.objects.create(feature=feature, content_object=media_asset)
+
+            reporting_level = ReportingStructure.objects.create(key=f"level-{i}", label=f"Level {i}", level=i)
+            role = Role.objects.create(
+                key=f"role-{i}", label=f"Role {i}", code=f"R{i}",
+                reporting_level=reporting_level, functional_area=functional_area
+            )
+            person = Person.objects.create(first_name=f"First {i}", last_name=f"Last {i}", initials="F", title="Mx")
+            Employee.objects.create(key=f"employee-{i}", person=person, role=role)
+
+            page = Page.objects.create(title=f"Page {i}", path=f"/pages/{i}", menu="header")
+            Page.objects.create(title=f"Child {i}", path=f"/pages/{i}/child", menu="header", parent=page)
+            Page.objects.create(title=f"Footer {i}", path=f"/pages/{i}/footer", menu="footer", parent=page)
+
+    def setUp(self):
+        CacheService.clear_object_cache()
+
+    def test_requests_stay_within_their_budgets(self):
+        budgets = QueryBudgetService.get_budgets()["requests"]
+
+        with self.settings(QUERY_BUDGET_STRICT=True):
+            for label in budgets:
+                command, target = label.split(":")
+                with self.subTest(label):
+                    response = self.client.get("/cb/", {command: target})
+                    self.assertEqual(response.status_code, 200)
+
+    def test_header_menu_stays_within_its_budget(self):
+        with self.settings(QUERY_BUDGET_STRICT=True):
+            response = self.client.get("/cb/", {"select": "Page", "with_context": "header"})
+
+        self.assertEqual(response.status_code, 200)
+        menu = {item["title"]: item["children"] for item in response.json()["data"]}
+        self.assertEqual(menu["Page 0"], [{"coverUrl": None, "items": [{"title": "Child 0", "path": "/pages/0/child"}]}])
+        self.assertEqual(menu["Child 0"], None)
+
+    def test_overruns_fail_in_strict_mode(self):
+        self.addCleanup(setattr, QueryBudgetService, "budgets", QueryBudgetService.budgets)
+        QueryBudgetService.budgets = {"requests": {"select:Service": 0}, "processors": {"Get:Service": 0}}
+
+        with self.settings(QUERY_BUDGET_STRICT=True), self.assertRaisesRegex(QueryBudgetExceeded, "Get:Service"):
+            self.client.get("/cb/", {"select": "Service"})
+
+    def test_queries_repeated_per_row_are_flagged(self):
+        with trace() as request_trace:
+            with span("Get:Loop"):
+                for service in Service.objects.all()[:3]:
+                    Service.objects.filter(pk=service.pk).exists()
+
+        repeated = request_trace.repeated_queries(threshold=3)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][0], "Get:Loop")
+        self.assertEqual(repeated[0][2], 3)
+        self.assertEqual(request_trace.max_queries("Get:Loop"), 4)
+
+
+class QuerysetRegistryTest(TestCase):
+    """Querysets are held for the lifetime of their request"""
+
+    def setUp(self):
+        CacheService.clear_object_cache()
+        QuerysetRegistry.clear()
+
+    def test_querysets_are_released_with_the_response(self):
+        response = self.client.get("/cb/", {"select": "Service"})
+        key = RestService.parse_request(RequestFactory().get("/cb/", {"select": "Service"})).cache_key
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(QuerysetRegistry.get(key, "Service"))
+        self.assertFalse(QuerysetRegistry._querysets)
+
+    def test_concurrent_requests_share_the_key(self):
+        request = RequestFactory().get("/cb/", {"select": "Service"})
+
+        with RestService.open_request(request) as first:
+            with RestService.open_request(request) as second:
+                QuerysetRegistry.set(second.key, "Service", Service.objects.all())
+            self.assertIsNotNone(QuerysetRegistry.get(first.key, "Service"))
+
+        self.assertIsNone(QuerysetRegistry.get(first.key, "Service"))
+
+    def test_registry_is_capped(self):
+        self.addCleanup(setattr, QuerysetRegistry, "max_requests", QuerysetRegistry.max_requests)
+        QuerysetRegistry.max_requests = 3
+        evicted = QuerysetRegistry.evicted
+
+        QuerysetRegistry.open("held")
+        self.addCleanup(QuerysetRegistry.release, "held")
+        QuerysetRegistry.set("held", "Service", Service.objects.all())
+        for i in range(5):
+            QuerysetRegistry.set(f"leaked-{i}", "Service", Service.objects.all())
+
+        self.assertEqual(len(QuerysetRegistry._querysets), 3)
+        self.assertIsNotNone(QuerysetRegistry.get("held", "Service"))
+        self.assertIsNotNone(QuerysetRegistry.get("leaked-4", "Service"))
+        self.assertEqual(QuerysetRegistry.evicted - evicted, 3)
+        self.assertIn("onit_queryset_registry_requests 3", QuerysetRegistry.get_metrics())
+
+
+class MetricsViewTest(TestCase):
+    """The metrics and the cache clearing are restricted to staff users"""
+
+    def test_metrics_require_a_staff_user(self):
+        with self.settings(DEBUG=False):
+            self.assertEqual(self.client.get("/cb/metrics").status_code, 403)
+
+            user = get_user_model().objects.create_user("operator", password="secret")
+            self.client.force_login(user)
+            self.assertEqual(self.client.get("/cb/metrics").status_code, 403)
+
+            user.is_staff = True
+            user.save()
+            response = self.client.get("/cb/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"onit_queryset_registry_requests", response.content)
+
+    def test_clearing_the_cache_requires_a_staff_post(self):
+        CacheService.set_object("key", EncodedResponse(body=b"{}", etag='"etag"'))
+
+        with self.settings(DEBUG=False):
+            self.assertEqual(self.client.post("/cb/clear-cache/").status_code, 403)
+            self.assertIsNotNone(CacheService.get_object("key"))
+
+            self.client.force_login(get_user_model().objects.create_user("operator", password="secret", is_staff=True))
+            self.assertEqual(self.client.get("/cb/clear-cache/").status_code, 405)
+            self.assertEqual(self.client.post("/cb/clear-cache/").status_code, 200)
+
+        self.assertIsNone(CacheService.get_object("key"))
+
+
+class SchemaSnapshotTest(TestCase):
+    """The database catalog is introspected once and snapshotted"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        override = self.settings(SCHEMA_SNAPSHOT_PATH=os.path.join(directory, "schema_snapshot.json"))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_catalog_is_introspected_in_batches(self):
+        with self.assertNumQueries(2):
+            catalog = PostgreSQLDatabase().introspect()
+
+        self.assertEqual(catalog["columns"]["api_service"][0], "id")
+        self.assertIn("key", catalog["columns"]["api_service"])
+        self.assertIn("api.service", catalog["content_types"])
+
+    def test_workers_start_from_the_snapshot(self):
+        first = PostgreSQLDatabase()
+        first.initialize()
+
+        # A worker started later only checks the migrations
+        with self.assertNumQueries(1):
+            second = PostgreSQLDatabase()
+            second.initialize()
+
+        self.assertEqual(second.service.field_names, first.service.field_names)
+        self.assertEqual(second.service.content_type_id, first.service.content_type_id)
+
+    def test_snapshot_is_discarded_when_migrations_change(self):
+        database = PostgreSQLDatabase()
+        database.catalog
+        snapshot = PostgreSQLDatabase().read_catalog_snapshot()
+        self.assertEqual(snapshot["version"], database.get_catalog_version())
+
+        database.write_catalog_snapshot({"columns": {}, "content_types": {}}, version="outdated")
+
+        with self.assertNumQueries(3):
+            self.assertIn("api_service", PostgreSQLDatabase().catalog["columns"])
+
+
+class BootTest(TestCase):
+    """The boot phase leaves nothing to build for the first request"""
+
+    def test_first_request_finds_the_shared_state_built(self):
+        boot()
+
+        self.assertIn("Get:Service", TransformationService.processors)
+        self.assertIn("select", DataService.commands)
+
+        with self.assertNumQueries(0):
+            table = DatabaseService.get_database().get(model_name="Service")
+            DataService.get_source("Database:Default").get_path_plan("Service", "MediaAsset")
+
+        self.assertIn("key", table.field_names)
+
+
+class RowApiTest(TestCase):
+    """Rows are immutable and leave the shared table untouched"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            Service.objects.create(key=f"service-{i}", label=f"Service {i}", path=f"/services/{i}", inforce=True)
+
+    def setUp(self):
+        self.table = DatabaseService.get_database().get(model_name="Service")
+
+    def test_rows_are_immutable_tuples(self):
+        row = self.table.first_row({"key": "service-1"})
+
+        self.assertEqual((row.key, row.label), ("service-1", "Service 1"))
+        self.assertEqual(self.table.get_row(row.id), row)
+        with self.assertRaises(AttributeError):
+            row.key = "service-2"
+
+    def test_rows_are_read_in_one_query(self):
+        with self.assertNumQueries(1):
+            rows = self.table.rows(by=["-key"])
+
+        self.assertEqual([row.key for row in rows], ["service-2", "service-1", "service-0"])
+        self.assertEqual(self.table.last_row(by=["key"]).key, "service-2")
+
+    def test_reads_leave_the_table_untouched(self):
+        self.table.record_type
+        state = dict(vars(self.table))
+        self.table.get(key="service-0")
+        self.table.first({"key": "service-1"})
+        self.table.first_row({"key": "service-2"})
+
+        self.assertEqual(vars(self.table), state)
+        self.assertFalse(hasattr(self.table, "key"))
+
+
+class BulkOperationsTest(TestCase):
+    """Bulk operations write in batches and invalidate the table once"""
+
+    def setUp(self):
+        self.table = DatabaseService.get_database().get(model_name="Service")
+        self.items = [
+            {"key": f"service-{i}", "label": f"Service {i}", "path": f"/services/{i}"}
+            for i in range(5)
+        ]
+
+    def statements(self, queries, verb):
+        """The statements run, but the savepoints of the atomic blocks"""
+        return [query["sql"] for query in queries if query["sql"].startswith(verb)]
+
+    def media_assets(self):
+        """A table whose model doesn't override save()"""
+        table = DatabaseService.get_database().get(model_name="MediaAsset")
+        items = [
+            {"key": f"asset-{i}", "label": f"Asset {i}", "format": "png", "category": "icon"}
+            for i in range(5)
+        ]
+
+        return table, items
+
+    def test_bulk_create_returns_the_ids_in_one_statement(self):
+        table, items = self.media_assets()
+        with CaptureQueriesContext(connection) as queries:
+            ids = table.bulk_create(items)
+
+        inserts = self.statements(queries, "INSERT")
+        self.assertEqual(len(inserts), 1)
+        self.assertIn("RETURNING", inserts[0])
+
+        keys = dict(MediaAsset.objects.filter(pk__in=ids).values_list("pk", "key"))
+        self.assertEqual([keys[pk] for pk in ids], [item["key"] for item in items])
+
+    def test_bulk_create_writes_in_batches(self):
+        table, items = self.media_assets()
+        with CaptureQueriesContext(connection) as queries:
+            table.bulk_create(items, batch_size=2)
+
+        self.assertEqual(len(self.statements(queries, "INSERT")), 3)
+        self.assertEqual(MediaAsset.objects.count(), 5)
+
+    def test_records_whose_model_overrides_save_are_saved(self):
+        table = DatabaseService.get_database().get(model_name="Enquiry")
+        items = [
+            {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", "message": "Hello"},
+            {"email": "anonymous@example.com", "message": "Hi"},
+        ]
+
+        ids = table.bulk_create(items)
+
+        # The key and label are set by Enquiry.save
+        enquiries = Enquiry.objects.filter(pk__in=ids).order_by("pk")
+        self.assertEqual([enquiry.key for enquiry in enquiries], ["enq-onit", "enq-onit"])
+        self.assertEqual(enquiries[0].label, "Enquiry: Ada Lovelace ada@example.com")
+
+    def test_bulk_update_sets_the_values_by_id(self):
+        ids = self.table.bulk_create(self.items)
+        Service.objects.update(last_update=None)
+
+        updated = self.table.bulk_update([{"id": str(pk), "label": f"Renamed {pk}"} for pk in ids[:3]])
+
+        self.assertEqual(updated, 3)
+        renamed = Service.objects.filter(label__startswith="Renamed")
+        self.assertEqual(sorted(renamed.values_list("pk", flat=True)), ids[:3])
+        self.assertFalse(renamed.filter(last_update=None).exists())
+
+        with self.assertRaises(ValueError):
+            self.table.bulk_update([{"id": max(ids) + 1, "label": "Missing"}])
+
+    def test_update_many_and_delete_many_filter_like_filter(self):
+        self.table.bulk_create(self.items)
+
+        with CaptureQueriesContext(connection) as queries:
+            updated = self.table.update_many({"featured": True}, {"key__in": ["service-0", "service-1"]})
+        self.assertEqual(updated, 2)
+        self.assertEqual(len(self.statements(queries, "UPDATE")), 1)
+        self.assertEqual(Service.objects.filter(featured=True).count(), 2)
+
+        self.assertEqual(self.table.delete_many({"featured": True}), 2)
+        self.assertEqual(self.table.delete_many(key="service-4", batch_size=1), 1)
+        self.assertEqual(Service.objects.count(), 2)
+
+    def record_invalidations(self) -> list:
+        invalidated = []
+        self.addCleanup(setattr, CacheService, "invalidate_tables", vars(CacheService)["invalidate_tables"])
+        CacheService.invalidate_tables = staticmethod(invalidated.append)
+
+        return invalidated
+
+    def test_invalidations_are_merged_per_bulk_operation(self):
+        invalidated = self.record_invalidations()
+
+        ids = self.table.bulk_create(self.items)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table.delete_many({"pk__in": ids})
+
+        # One invalidation for the rows deleted one signal at a time
+        self.assertEqual(invalidated, [["Service"]])
+
+    def test_rolled_back_invalidations_are_dropped(self):
+        invalidated = self.record_invalidations()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError):
+                self.table.bulk_update([{"id": 0, "label": "Missing"}])
+            with self.assertRaises(ValueError), transaction.atomic():
+                Service.objects.create(key="rolled-back", label="Rolled back", path="/rolled-back")
+                raise ValueError("Rolled back")
+
+            MediaAsset.objects.create(key="logo", label="Logo", format="png", category="icon")
+
+        self.assertEqual(invalidated, [["MediaAsset"]])
+
+    def test_update_and_delete_still_require_a_unique_match(self):
+        self.table.bulk_create(self.items)
+
+        with self.assertRaises(ValueError):
+            self.table.update({"featured": True}, {"key__startswith": "service-"})
+        with self.assertRaises(ValueError):
+            self.table.delete({"key": "missing"})
+
+        self.table.update({"featured": True}, key="service-0")
+        self.assertTrue(Service.objects.get(key="service-0").featured)
+
+    def test_a_list_of_records_is_posted_in_bulk(self):
+        response = self.client.post(
+            "/cb/?insert=Service", data=json.dumps(self.items), content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        ids = json.loads(response.content)["data"]
+        self.assertEqual(sorted(Service.objects.values_list("pk", flat=True)), sorted(ids))
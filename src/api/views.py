@@ -5,18 +5,27 @@ Handling Requests from the frontend
 
 import json
 import logging
-from django.core.cache import cache
+import os
+from contextlib import nullcontext
 from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.db import transaction
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 from django.shortcuts import redirect
 from api.models import Employee, MediaAsset, Person, EntityMedia
+from components.dataclasses import RequestContext
+from libs.querysets import QuerysetRegistry
 from libs.strings import camel_to_snake
+from libs.tracing import trace
+from services.cache.cache import CacheService
+from services.cache.warmup import CacheWarmer
 from services.database import DatabaseService
 from services.data import DataService
 from services.rest import RestService
 from services.processing import TransformationService
+from services.query_budget import QueryBudgetService
 
 logger = logging.getLogger("django")
 
@@ -29,10 +38,21 @@ def view_manager(request: HttpRequest):
     the view to handle the request.
     """
 
-    request_key = RestService.hash_request(request)
-    view = RestService.get_view(request_key)
+    # Untraced, the spans are no-ops and the queries are not wrapped
+    budgeted = QueryBudgetService.is_enabled()
+    traced = budgeted or RestService.is_tracing()
+    request_tracing = trace(count_shapes=budgeted) if traced else nullcontext()
 
-    return view(request_key)
+    with RestService.open_request(request) as request_context, request_tracing as request_trace:
+        view = RestService.get_view(request_context)
+        response = view(request_context)
+
+    if budgeted:
+        QueryBudgetService.check(request_context, request_trace)
+    if traced:
+        RestService.report_trace(request_context, request_trace, response)
+
+    return response
 
 
 ###############################################################################
@@ -42,23 +62,40 @@ def view_manager(request: HttpRequest):
 
 @csrf_exempt
 @RestService.register_view('TOKEN:CSRF')
-def get_token(request_key):
+def get_token(request_context):
     """
     View to handle GET requests for CSRF token
     """
-    request = RestService.get_request(request_key)
-    return RestService.get_token(request)
+    return RestService.get_token(request_context.request)
 
 
 @RestService.register_view('GET')
-def get_handler(request_key):
+def get_handler(request_context):
     """
     View to handle GET requests from the frontend
     """
-    try:
-        data = DataService.fetch_data(request_key)
+    CacheWarmer.record(request_context.parsed)
+
+    # The fill may outlive the request (stale-while-revalidate): it gets a
+    # context without the request
+    fill_context = RequestContext(parsed=request_context.parsed)
+
+    def fill():
+        # Hold the querysets of the key until the fill is done, even if the
+        # response of the request was sent
+        QuerysetRegistry.open(fill_context.key)
+        try:
+            data = DataService.fetch_data(fill_context)
+            encoded = RestService.encode_response(fill_context, data)
+        finally:
+            QuerysetRegistry.release(fill_context.key)
+
+        # Empty results are answers too: cached, for a shorter time
+        return encoded, DEFAULT_TIMEOUT if data else CacheService.negative_timeout()
 
-        return RestService.response(request_key, data)
+    try:
+        encoded = CacheService.get_or_fill(request_context.key, fill)
+        return RestService.conditional_response(request_context, encoded)
     except ValueError as e:
         return RestService.error_response(error=e)
 
@@ -70,32 +107,43 @@ def get_handler(request_key):
 
 @transaction.atomic
 @RestService.register_view('POST')
-def post_handler(request_key):
+def post_handler(request_context):
     """
-    View to handle POST requests from the frontend
+    View to handle POST requests from the frontend. A list of records is
+    created in bulk (see Table.bulk_create), and the response holds their ids.
     """
     try:
-        request = RestService.get_request(request_key)
+        request = request_context.request
         if request:
             logger.info(f"Received cookies: {request.COOKIES}")
 
-        # Set the request
-        data = RestService.get_request_body(request_key)
-        table_name = RestService.get_command_target(request_key)
+        # Set the request (a JSONDecodeError is a ValueError)
+        payload = json.loads(request_context.body)
+        table_name = request_context.parsed.target
 
-        # Create the record
+        # Create the record(s)
         onitdb = DatabaseService.get_database()
         table = onitdb.get(camel_to_snake(table_name))
 
-        processor = TransformationService.get_processor(f"Create:{table_name}:Pre")
-        preprocessed_data = processor.transform(data, request_key)
+        pre_processor = TransformationService.get_processor(f"Create:{table_name}:Pre")
+        post_processor = TransformationService.get_processor(f"Create:{table_name}:Post")
+
+        if isinstance(payload, list):
+            rows = [pre_processor.transform(item, request_context) for item in payload]
+            data = table.bulk_create(rows)
+
+            for record_id in data:
+                post_processor.transform(record_id, request_context)
+
+            return RestService.response(request_context, data)
+
+        preprocessed_data = pre_processor.transform(payload, request_context)
 
         data = table.create(preprocessed_data)
 
-        processor = TransformationService.get_processor(f"Create:{table_name}:Post")
-        preprocessed_data = processor.transform(data, request_key)
+        post_processor.transform(data, request_context)
 
-        return RestService.response(request_key, data)
+        return RestService.response(request_context, data)
     except ValueError as err:
         return RestService.error_response(error=err)
 
@@ -128,16 +176,41 @@ def health_check(request, *args, **kwargs):
     return HttpResponse("OK")
 
 
+###############################################################################
+#                                METRICS VIEW                                 #
+###############################################################################
+
+
+def metrics(request, *args, **kwargs):
+    """
+    View to expose the cache and queryset registry metrics of the worker in
+    the Prometheus text format, to staff users (or anyone with DEBUG)
+    """
+    if not (settings.DEBUG or request.user.is_staff):
+        return RestService.error_response(error="Metrics are restricted to staff users", status=403)
+
+    worker = {"worker": os.getpid()}
+    return HttpResponse(
+        CacheService.get_metrics() + QuerysetRegistry.get_metrics(worker),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 ###############################################################################
 #                                CLEAR CACHE                                  #
 ###############################################################################
 
 
+@require_POST
 def clear_cache(request, *args, **kwargs):
     """
-    View to handle requests to the root URL
+    View to clear the cache of every worker (both tiers, the dependency index
+    and the snapshot), to staff users (or anyone with DEBUG)
     """
-    cache.clear()
+    if not (settings.DEBUG or request.user.is_staff):
+        return RestService.error_response(error="Clearing the cache is restricted to staff users", status=403)
+
+    CacheService.clear_object_cache()
     return JsonResponse({"message": "Cache cleared"})
 
 
@@ -147,7 +220,7 @@ def clear_cache(request, *args, **kwargs):
 
 
 def backend_test(request, *args, **kwargs):
-    request_key = RestService.hash_request(request)
+    request_key = RestService.parse_request(request).cache_key
     return JsonResponse({"hash": request_key})
 
 
@@ -155,9 +228,9 @@ def test_view(request, request_key=None):
     """
     View to handle test requests from the frontend
     """
-    request_key = RestService.hash_request(request)
+    with RestService.open_request(request) as request_context:
 
-    # Select related entities
-    data = EntityMedia.objects.filter(object_id__in=1, content_type__model='service')
+        # Select related entities
+        data = EntityMedia.objects.filter(object_id__in=1, content_type__model='service')
 
-    return RestService.response(request_key, data=list(data.values()))
+        return RestService.response(request_context, data=list(data.values()))
@@ -0,0 +1,111 @@
+from typing import Optional, Sequence
+
+from django.contrib.contenttypes.fields import GenericRelation
+from django.core.exceptions import FieldDoesNotExist
+
+from components.graphs import Node
+from components.processors.query import Query
+from services.database import DatabaseService
+
+@Query.register_builder('Path')
+class PathQueryBuilder():
+    """
+    Query builder for a path of models. Resolves the filters on the source
+    model into lookups on the target model, so that the whole path is
+    executed as one joined query.
+    """
+
+    lookups: dict[tuple[str, ...], Optional[str]] = {}
+
+    @staticmethod
+    def fit(query: dict, path: Sequence[Node] = (), *args, **kwargs) -> Optional[dict]:
+        """
+        Builds the query on the first model of the path (target) from the
+        query on the last model of the path (source), as fitted by the
+        default query builder.
+
+        Returns None when a hop of the path cannot be expressed as a join.
+        """
+        lookup = PathQueryBuilder.get_lookup(path)
+        if lookup is None:
+            return None
+
+        if not lookup:
+            return query
+
+        include = query.get("include", {})
+        exclude = query.get("exclude", {})
+
+        # Exclusions through multi-valued relations don't mean the same as on
+        # the source, so only then the source is resolved in a subquery
+        if exclude:
+            db = DatabaseService.get_database()
+            source_model = db.get(model_name=path[-1].name).data_model
+            source_queryset = source_model.objects.filter(**include).exclude(**exclude)
+
+            return {"include": {f"{lookup}__in": source_queryset.values("pk")}, "exclude": {}}
+
+        include = {f"{lookup}__{key}": value for key, value in include.items()}
+        if not include:
+            include = {f"{lookup}__isnull": False}
+
+        return {"include": include, "exclude": {}}
+
+    @staticmethod
+    def get_lookup(path: Sequence[Node]) -> Optional[str]:
+        """
+        Returns the lookup from the first to the last model of the path, e.g.
+        `entitymedia__media_asset`. Empty for a path of one model.
+        """
+        names = tuple(node.name for node in path)
+        if names not in PathQueryBuilder.lookups:
+            PathQueryBuilder.lookups[names] = PathQueryBuilder._resolve_lookup(path)
+
+        return PathQueryBuilder.lookups[names]
+
+    @staticmethod
+    def get_hop(node: Node, neighbour: Node) -> Optional[str]:
+        """
+        Returns the lookup from a model to its neighbour on the path. Hops from
+        an intermediate table to a generic foreign key (content_type +
+        object_id) use the related query name of the neighbour's GenericRelation.
+        """
+        db = DatabaseService.get_database()
+
+        try:
+            model = db.get(model_name=node.name).data_model
+            neighbour_model = db.get(model_name=neighbour.name).data_model
+        except ValueError:
+            return None
+
+        if model is None or neighbour_model is None:
+            return None
+
+        try:
+            foreign_key = node.foreign_key_to(neighbour.name)
+        except KeyError:
+            return None
+
+        if foreign_key == "object_id":
+            for field in neighbour_model._meta.private_fields:
+                if isinstance(field, GenericRelation) and field.related_model is model:
+                    return field.remote_field.related_query_name
+            return None
+
+        try:
+            model._meta.get_field(foreign_key)
+        except FieldDoesNotExist:
+            return None
+
+        return foreign_key
+
+    @staticmethod
+    def _resolve_lookup(path: Sequence[Node]) -> Optional[str]:
+        hops = []
+        for i in range(len(path) - 1):
+            hop = PathQueryBuilder.get_hop(path[i], path[i + 1])
+            if not hop:
+                return None
+            hops.append(hop)
+
+        return "__".join(hops)
@@ -2,8 +2,14 @@
 components/dataclasses/__init__.py
 """
 
+from .encoded_response import EncodedResponse
 from .field import TableField
+from .parsed_request import ParsedRequest
+from .request_context import RequestContext
 
 __all__ = [
+  "EncodedResponse",
+  "ParsedRequest",
+  "RequestContext",
   "TableField",
 ]
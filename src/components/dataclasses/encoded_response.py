@@ -0,0 +1,23 @@
+from dataclasses import dataclass, field
+from time import time
+
+@dataclass(frozen=True, slots=True)
+class EncodedResponse:
+    """
+    A response body as encoded once, ready to be copied into an HttpResponse.
+
+    body: The encoded JSON envelope
+    etag: A strong entity tag of the body
+    created_at: When the response was encoded (epoch seconds), i.e. its age.
+        Also its Last-Modified: a change to the data evicts the cached
+        response, so the data has not changed since it was encoded.
+    """
+    body: bytes
+    etag: str
+    content_type: str = "application/json"
+    status: int = 200
+    created_at: float = field(default_factory=time)
+
+    def __sizeof__(self) -> int:
+        # Account for the body, so the object cache sees the real footprint
+        return object.__sizeof__(self) + len(self.body)
@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+from urllib.parse import urlencode
+
+@dataclass(frozen=True, slots=True)
+class ParsedRequest:
+    """
+    A request as parsed once by view_manager.
+
+    targets: The command target split on '-', i.e. (target, source)
+    query_parameters: The raw filter parameters, sorted by name
+    filters: The filter parameters fitted by the default query builder
+    cache_key: A key for the request that ignores the order of its parameters
+    """
+    method: str
+    endpoint: str
+    command: str
+    targets: tuple[str, ...]
+    query_parameters: tuple[tuple[str, str], ...]
+    filters: dict[str, Any]
+    endpoint_context: Optional[str]
+    cache_key: str
+
+    @property
+    def target(self) -> str:
+        """The table whose records are returned"""
+        return self.targets[0] if self.targets else ""
+
+    @property
+    def source(self) -> str:
+        """The table the filters apply to, defaults to the target"""
+        return self.targets[1] if len(self.targets) == 2 else self.target
+
+    @property
+    def canonical_path(self) -> str:
+        """The request as a path with its parameters in canonical order"""
+        parameters = [(self.command, "-".join(self.targets)), *self.query_parameters]
+        if self.endpoint_context is not None:
+            parameters.append(("with_context", self.endpoint_context))
+
+        return f"/{self.endpoint}/?{urlencode(parameters)}"
@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+from django.http import HttpRequest
+from typing import Optional
+
+from components.dataclasses.parsed_request import ParsedRequest
+from libs.querysets import QuerysetRegistry
+from services.cache.dependencies import CacheDependencies
+
+@dataclass(slots=True)
+class RequestContext:
+    """
+    The state of one request, from view_manager until its response is sent.
+    Passed to the services, sources and processors instead of a request key.
+    """
+    parsed: ParsedRequest
+    request: Optional[HttpRequest] = None
+
+    @property
+    def key(self) -> str:
+        """The cache key of the request"""
+        return self.parsed.cache_key
+
+    @property
+    def body(self) -> str:
+        """The decoded request body"""
+        if self.request is None:
+            raise ValueError("The request has been released.")
+
+        return self.request.body.decode('utf-8')
+
+    def close(self) -> None:
+        """
+        Releases the request (body, cookies, ...) once the response is sent,
+        with the querysets and dependencies recorded under its key, unless a
+        concurrent request for the same key still holds them.
+        """
+        self.request = None
+        if QuerysetRegistry.release(self.key):
+            CacheDependencies.release(self.key)
+
+    def __enter__(self):
+        QuerysetRegistry.open(self.key)
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,9 +1,10 @@
 
 from .query_path import QueryPath
-from.graph import Graph, Node
+from.graph import Graph, GraphTopology, Node
 
 __all__ = [
   'QueryPath',
   'Graph',
+  'GraphTopology',
   'Node'
 ]
\ No newline at end of file
@@ -1,5 +1,6 @@
 
 import copy
+from dataclasses import dataclass
 from typing import Optional
 
 class Node():
@@ -34,6 +35,13 @@ class Node():
 
         self.foreign_key = self.__foreign_keys[neighbour]
 
+    def foreign_key_to(self, neighbour) -> str:
+        """Returns the foreign key facing a neighbour without changing the node"""
+        if not self.__foreign_keys:
+            return ""
+
+        return self.__foreign_keys[neighbour]
+
     def distance_to(self, neighbour):
         """Returns the distance to a neighbour"""
         if neighbour not in self.__neighbour_distances:
@@ -122,6 +130,18 @@ class Node():
     def __gt__(self, other):
         return self.cost > other.distance
 
+@dataclass(frozen=True, slots=True)
+class GraphTopology:
+    """
+    An index of the nodes and edges of a graph by node position. Searches
+    keep their state in arrays of the same length instead of on the nodes.
+    """
+    nodes: tuple[Node, ...]
+    index: dict[str, int]
+    adjacency: tuple[tuple[tuple[int, float], ...], ...]
+    heights: tuple[int, ...]
+
+
 class Graph():
     """
     A class to represent the schema of a database as a graph
@@ -129,11 +149,17 @@ class Graph():
 
     def __init__(self):
         self.nodes: dict[str, Node] = {}
+        self.__topology: Optional[GraphTopology] = None
+        self.__frozen = False
         super().__init__()
 
     def add_node(self, name, schema):
         """Adds a node to the graph"""
+        if self.__frozen:
+            raise RuntimeError(f"Cannot add node '{name}' to a frozen graph.")
+
         self.nodes[name] = Node(name, schema=schema)
+        self.__topology = None
 
     def get_node(self, name) -> Node:
         """Returns a node from the graph"""
@@ -147,3 +173,32 @@ class Graph():
         for node in self.nodes:
             self.nodes[node].reset()
 
+    def freeze(self):
+        """Builds the topology and prevents further changes to it"""
+        _ = self.topology
+        self.__frozen = True
+
+    @property
+    def frozen(self) -> bool:
+        """Whether the topology of the graph can still change"""
+        return self.__frozen
+
+    @property
+    def topology(self) -> GraphTopology:
+        """Returns the node index of the graph, built on first use"""
+        if self.__topology is None:
+            nodes = tuple(self.nodes.values())
+            index = {node.name: i for i, node in enumerate(nodes)}
+            adjacency = tuple(
+                tuple(
+                    (index[neighbour], node.distance_to(neighbour))
+                    for neighbour in node.neighbours if neighbour in index
+                )
+                for node in nodes
+            )
+            heights = tuple(node.height for node in nodes)
+
+            self.__topology = GraphTopology(nodes, index, adjacency, heights)
+
+        return self.__topology
+
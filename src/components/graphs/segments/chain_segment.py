@@ -22,7 +22,7 @@ class ChainSegment(Segment):
             if i == len(self.nodes) - 1:
                 break
 
-            query_keys.append(node.foreign_key)
+            query_keys.append(node.foreign_key_to(self.nodes[i + 1].name))
 
         query_keys.append('id__in')
         query_key_string = '__'.join(query_keys)
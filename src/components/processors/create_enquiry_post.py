@@ -32,18 +32,18 @@ class EnquiryCreatePostProcessor(Processor):
         onitdb = DatabaseService.get_database()
         self.table = onitdb.enquiry
 
-    def transform(self, data, request_key=None):
+    def transform(self, data, request_context=None):
         """
         Method to process data after creating a record
         """
-        services = self.create_entity_features(data, request_key)
+        services = self.create_entity_features(data, request_context)
         data["services"] = services
 
         self._send_notifications(data)
 
         return data
 
-    def create_entity_features(self, data, request_key):
+    def create_entity_features(self, data, request_context):
         """
         Method to create EntityFeature records
 
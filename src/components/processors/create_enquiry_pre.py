@@ -25,14 +25,14 @@ class EnquiryCreatePreProcessor(Processor):
         onitdb = DatabaseService.get_database()
         self.table = onitdb.enquiry
 
-    def transform(self, data, request_key=None):
+    def transform(self, data, request_context=None):
         """
         Method to process data before creating a record
         """
-        self.create_provisional_entity_features(data, request_key)
+        self.create_provisional_entity_features(data, request_context)
         return self.sanitize_data(data)
 
-    def create_provisional_entity_features(self, data, request_key):
+    def create_provisional_entity_features(self, data, request_context):
         """
         Method to create EntityFeature records
 
@@ -43,7 +43,7 @@ class EnquiryCreatePreProcessor(Processor):
             implementation="Create:EnquiryFeature"
         )
         entity_feature_items = transformer.transform(data["services"])
-        self.table.create_provisional_records(request_key, entity_feature_items)
+        self.table.create_provisional_records(request_context.key, entity_feature_items)
 
     def sanitize_data(self, data):
         """
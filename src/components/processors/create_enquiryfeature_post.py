@@ -25,10 +25,10 @@ class EnquiryFeatureProcessor(Processor):
 
         enquiry_feature_data = {}
         for service in services:
-            onitdb.feature.filter({"key": service}).first()
+            feature = onitdb.feature.first_row({"key": service})
 
             enquiry_feature_data[service] = {
-                'feature': onitdb.feature.id,
+                'feature': feature.id if feature else None,
                 'content_type': content_type,
                 "object_id": None,
             }
@@ -25,7 +25,7 @@ class TableCreatePostProcessor(Processor):
     Concrete class - TableCreatePostProcessor Implementation
     """
 
-    def transform(self, data, request_key=None):
+    def transform(self, data, request_context=None):
         """
         Method to process data after creating a record
         """
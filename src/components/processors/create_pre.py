@@ -21,7 +21,7 @@ class TableCreatePreprocessor(Processor):
     def __init__(self, *args, **kwargs):
         self.table = kwargs.get("table", None)
 
-    def transform(self, data, request_key=None):
+    def transform(self, data, request_context=None):
         """
         Method to process data before creating a record
         """
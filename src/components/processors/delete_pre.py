@@ -24,7 +24,7 @@ class TableDeletePreprocessor(Processor):
         self.table = kwargs.get("table", None)
         self.database = DatabaseService.get_database()
 
-    def transform(self, data, request_key=None):
+    def transform(self, data, request_context=None):
         """
         Method to process data before deleting a record
         """
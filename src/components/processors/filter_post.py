@@ -20,9 +20,9 @@ class TableFilterPostProcessor(Processor):
     def __init__(self, *args, **kwargs):
         self.table = kwargs.get("table", None)
 
-    def transform(self, request_key=None, *args, **kwargs):
+    def transform(self, data, request_context=None, *args, **kwargs):
         """
         Method to process data after filtering a table
         """
         # Remove record linked to inactive entities (if applicable)
-        return args[0]
+        return data
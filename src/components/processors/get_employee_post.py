@@ -4,6 +4,8 @@ Data Transformer - Employee
 Source: Employee
 """
 
+from django.db.models import QuerySet
+
 from components.processors import Processor
 from services.processing import TransformationService
 
@@ -20,6 +22,10 @@ class EmployeeProcessor(Processor):
     def transform(self, data, *args, **kwargs):
         person_transformer = TransformationService.get_processor('Get:Person')
         role_transformer = TransformationService.get_processor('Get:Role')
+        # The person and role (with its levels) of every employee in one query
+        if isinstance(data, QuerySet):
+            data = data.select_related("person", "role__reporting_level", "role__functional_area")
+
         employee_data = []
         for employee in data:
             employee_data.append({
@@ -4,6 +4,8 @@ Data transformer - EntityFeature
 Source: EntityFeature
 """
 
+from django.db.models import QuerySet
+
 from components.processors import Processor
 from services.processing import TransformationService
 
@@ -18,6 +20,10 @@ class EntityFeatureProcessor(Processor):
     """
 
     def transform(self, data, *args, **kwargs):
+        # One query for the features, and one per type of entity
+        if isinstance(data, QuerySet):
+            data = data.select_related("feature").prefetch_related("content_object")
+
         entity_feature_data = []
         for entity_feature in data:
             entity_feature_data.append({
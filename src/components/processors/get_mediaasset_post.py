@@ -18,10 +18,10 @@ class MediaAssetProcessor(Processor):
     Context: Getting data from the database table: Entity media
     """
 
-    def transform(self, data, request_key, *args, **kwargs):
+    def transform(self, data, request_context, *args, **kwargs):
         onitdb = DatabaseService.get_database()
         entity_media_set = onitdb.entity_media.get_queryset(
-            request_key, reset=False
+            request_context.key, reset=False
         )
 
         media_asset_data = [{
@@ -36,7 +36,7 @@ class MediaAssetProcessor(Processor):
         } for media in entity_media_set if media.media_asset] if entity_media_set else []
 
         if media_asset_data:
-            onitdb.entity_media.set_queryset(request_key, queryset=None)
+            onitdb.entity_media.clear_queryset(request_context.key)
             return self.deduplicate(media_asset_data)
 
         transformer = TransformationService.get_processor(
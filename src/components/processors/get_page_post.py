@@ -4,8 +4,9 @@ Data Transformer - Page
 Source: Page
 """
 
+from django.db.models import QuerySet
+
 from components.processors import Processor
-from services.rest import RestService
 from services.processing import TransformationService
 
 
@@ -18,17 +19,20 @@ class PageProcessor(Processor):
     Context: Getting data from the database table: Page
     """
 
-    def transform(self, data, request_key, *args, **kwargs):
+    def transform(self, data, request_context, *args, **kwargs):
         transformer = TransformationService.get_processor("Get:Page")
 
-        if request_key is None:
-            raise ValueError(f"Request key is required for processing Page data.")
+        if request_context is None:
+            raise ValueError(f"Request context is required for processing Page data.")
 
-        context = RestService.get_context(request_key)
+        context = request_context.parsed.endpoint_context
         if context:
             transformer = TransformationService.get_processor(context)
             return transformer.transform(data)
 
+        if isinstance(data, QuerySet):
+            data = data.select_related("parent")
+
         page_data = []
         for page in data:
             page_data.append({
@@ -38,7 +42,7 @@ class PageProcessor(Processor):
                 "cover_url": page.cover_url,
                 "menu": page.menu,
                 "active": page.active,
-                "parent": transformer.transform([page.parent]) if page.parent else None
+                "parent": transformer.transform([page.parent], request_context) if page.parent else None
             })
 
         return page_data
@@ -20,8 +20,8 @@ class TableGetPostProcessor(Processor):
     def __init__(self, *args, **kwargs):
         self.table = kwargs.get("table", None)
 
-    def transform(self, request_key=None, *args, **kwargs):
+    def transform(self, data, request_context=None, *args, **kwargs):
         """
         Method to process data after getting a record
         """
-        return args[0]
+        return data
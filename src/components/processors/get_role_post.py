@@ -4,6 +4,8 @@ Data Transformer - Role
 Source: Role
 """
 
+from django.db.models import QuerySet
+
 from components.processors import Processor
 from services.processing import TransformationService
 
@@ -25,6 +27,9 @@ class RoleProcessor(Processor):
             implementation='Get:FunctionalArea'
         )
 
+        if isinstance(data, QuerySet):
+            data = data.select_related("reporting_level", "functional_area")
+
         role_data = []
         for role in data:
             role_data.append({
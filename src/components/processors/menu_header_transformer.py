@@ -4,6 +4,8 @@ Data transformer - Header Menu
 Source: Header menu data
 """
 
+from django.db.models import prefetch_related_objects
+
 from components.processors import Processor
 from services.processing import TransformationService
 
@@ -18,15 +20,20 @@ class HeaderMenuProcessor(Processor):
     """
 
     def transform(self, data, *args, **kwargs):
+        # The children of every page in one query, rather than two per page
+        pages = list(data)
+        prefetch_related_objects(pages, "children")
+
         nav_data = []
-        for page in data:
+        for page in pages:
+            children = page.children.all()
             nav_data.append({
                 "title": page.title,
                 "path": page.path,
                 "children": [{
                     "coverUrl": child.cover_url,
                     "items": [{"title": child.title, "path": child.path}]
-                } for child in page.children.filter(menu="header", active=True)] if page.children.exists() else None
+                } for child in children if child.menu == "header" and child.active] if children else None
             })
 
         return nav_data
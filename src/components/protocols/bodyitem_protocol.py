@@ -6,8 +6,6 @@ from components.dataclasses import TableField
 
 class BodyItemTable(Protocol):
     table_name: str
-    id: int
-    key: str
     content_type_id: int
     dependent_table: str
     foreign_keys: dict[str, str]
@@ -59,10 +57,45 @@ class BodyItemTable(Protocol):
     def set_queryset(self, request_key, queryset=None, filter_params=None, reset=False) -> None:
         '''Method to handle specific queryset operations'''
 
+    def clear_queryset(self, request_key) -> None:
+        '''Method to drop the queryset of the request key'''
+
+    def rows(self, query={}, by=[], **kwargs) -> list[tuple]:
+        '''Gets multiple records as immutable rows'''
+        ...
+
+    def get_row(self, *args, **kwargs) -> tuple | None:
+        '''Gets a record as an immutable row'''
+        ...
+
+    def first_row(self, query={}, by=[], **kwargs) -> tuple | None:
+        '''Gets the first record as an immutable row'''
+        ...
+
+    def last_row(self, query={}, by=[], **kwargs) -> tuple | None:
+        '''Gets the last record as an immutable row'''
+        ...
+
     def update(self, item, query = {}, allow_multiple_updates=False, **kwargs) -> models.QuerySet:
         '''Updates one or more records in the database'''
         ...
 
+    def bulk_create(self, items, batch_size=None) -> list[int]:
+        '''Creates records in batches, returns their ids'''
+        ...
+
+    def bulk_update(self, items, batch_size=None) -> int:
+        '''Updates records by id in batches'''
+        ...
+
+    def update_many(self, item, query={}, **kwargs) -> int:
+        '''Sets the same values on every record matching the query'''
+        ...
+
+    def delete_many(self, query={}, batch_size=None, **kwargs) -> int:
+        '''Deletes every record matching the query, in batches'''
+        ...
+
     @property
     def field_names(self) -> list[str]: ...
 
@@ -5,11 +5,13 @@ Abstract Base Class for Data Loaders
 from abc import ABC, abstractmethod
 from typing import Any
 
+from components.dataclasses import RequestContext
+
 class Source(ABC):
 
     def __init__(self, label = "") -> None:
         self.label = label
 
     @abstractmethod
-    def fetch(self, request_key: str) -> Any:
+    def fetch(self, request_context: RequestContext) -> Any:
         """Fetches data from the source"""
\ No newline at end of file
@@ -1,10 +1,15 @@
 
+import hashlib
 import json
+import logging
+import os
+import threading
 from pathlib import Path
 from typing import Optional, Set, Type
 
 from django.apps import apps
-from django.db import connection
+from django.conf import settings
+from django.db import DatabaseError, connection
 from django.db.models import ManyToManyField, Model
 from django.contrib.contenttypes.models import ContentType
 
@@ -16,6 +21,11 @@ from services.database import DatabaseService
 @DatabaseService.register_database("PostgreSQL")
 class PostgreSQLDatabase(Database):
 
+    logger = logging.getLogger("django")
+
+    # Bumped when the layout of the catalog snapshot changes
+    catalog_format = 1
+
     def __init__(self) -> None:
         self.engine = "PostgreSQL"
         self.__name = ""
@@ -31,7 +41,12 @@ class PostgreSQLDatabase(Database):
         self._model_names: dict[str, str] = {}
         self._content_types_map: dict[int, str] = {}
         self._content_types: dict[str, int] = {}
+        self._catalog: Optional[dict] = None
         self._is_initialized = False
+        self._lock = threading.RLock()
+
+        # Read at import, checked against the migrations when first used
+        self._catalog_snapshot = self.read_catalog_snapshot()
 
     def get(
         self,
@@ -41,8 +56,7 @@ class PostgreSQLDatabase(Database):
         db_table_name: Optional[str] = None
     ) -> Table:
         if not self._is_initialized:
-            self.initialize()
-            self._is_initialized = True
+            self.initialize_once()
 
         provided_field = "table name"
         provided_value = None
@@ -99,19 +113,103 @@ class PostgreSQLDatabase(Database):
 
             app_label = model._meta.app_label
             content_type_label = model_name.replace("_", "").lower()
-            content_type = ContentType.objects.filter(app_label=app_label, model=content_type_label).first()
-            if content_type:
-                self._content_types_map[content_type.pk] = table_name
-                self._content_types[table_name] = content_type.pk
+            content_type_id = self.catalog["content_types"].get(f"{app_label}.{content_type_label}")
+            if content_type_id:
+                self._content_types_map[content_type_id] = table_name
+                self._content_types[table_name] = content_type_id
+
+    def introspect(self) -> dict:
+        """
+        Reads the catalog of the database in one pass: the columns of every
+        table (in order) and the content type ids, in two queries.
+        """
+        columns: dict[str, list[str]] = {}
+        with connection.cursor() as cursor:
+            cursor.execute("""
+              SELECT table_name, column_name
+                FROM information_schema.columns
+               WHERE table_schema = 'public'
+               ORDER BY table_name, ordinal_position
+            """)
+            for db_table_name, column_name in cursor.fetchall():
+                columns.setdefault(db_table_name, []).append(column_name)
+
+        content_types = {
+            f"{app_label}.{model}": pk
+            for pk, app_label, model in ContentType.objects.values_list("pk", "app_label", "model")
+        }
+
+        return {"columns": columns, "content_types": content_types}
+
+    def get_catalog_version(self) -> str:
+        """
+        The version stamp of the catalog: the database and its applied
+        migrations (one query). Empty if the migrations can't be read.
+        """
+        database = settings.DATABASES["default"]
+        stamp = hashlib.md5(
+            f"{self.catalog_format}:{database.get('HOST')}:{database.get('NAME')}".encode("utf-8")
+        )
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT app, name FROM django_migrations ORDER BY app, name")
+                for app, name in cursor.fetchall():
+                    stamp.update(f"{app}.{name};".encode("utf-8"))
+        except DatabaseError:
+            return ""
+
+        return stamp.hexdigest()
+
+    def read_catalog_snapshot(self) -> Optional[dict]:
+        path = getattr(settings, "SCHEMA_SNAPSHOT_PATH", "")
+        if not path or not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            self.logger.warning(f"Unable to read the schema snapshot: {error}")
+            return None
+
+    def write_catalog_snapshot(self, catalog: dict, version: str) -> None:
+        path = getattr(settings, "SCHEMA_SNAPSHOT_PATH", "")
+        if not path or not version:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+            # Replaced atomically: the other workers may be reading it
+            temporary_path = f"{path}.{os.getpid()}"
+            with open(temporary_path, 'w') as file:
+                json.dump({"version": version, **catalog}, file)
+            os.replace(temporary_path, path)
+        except OSError as error:
+            self.logger.warning(f"Unable to write the schema snapshot: {error}")
+
+    def initialize_once(self):
+        """
+        Initializes the tables once, even when requests arrive concurrently.
+        Called by the boot phase (onit.boot), or else by the first request.
+        """
+        with self._lock:
+            if not self._is_initialized:
+                self.initialize()
+                self._is_initialized = True
 
     def initialize(self):
         self.map_table_models()
         schema = self.schema
+        columns = self.catalog["columns"]
         for table_name in self.table_names:
+              db_table_name = self._db_table_names.get(table_name)
               table = Table(
                   table_name=table_name,
-                  db_table_name=self._db_table_names.get(table_name),
-                  model=self._models.get(table_name)
+                  db_table_name=db_table_name,
+                  model=self._models.get(table_name),
+                  field_names=columns.get(db_table_name)
               )
               table.model_name = self._model_names.get(table_name)
               table.content_type_id = self._content_types.get(table_name, 0)
@@ -130,21 +228,34 @@ class PostgreSQLDatabase(Database):
     #                               PROPERTIES                                #
     ###########################################################################
 
+    @property
+    def catalog(self) -> dict:
+        """
+        The columns of the tables and the content type ids, from the schema
+        snapshot (SCHEMA_SNAPSHOT_PATH) while the applied migrations match it,
+        otherwise introspected and snapshotted for the next workers.
+        """
+        if self._catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    version = self.get_catalog_version()
+                    snapshot = self._catalog_snapshot
+                    if version and snapshot and snapshot.get("version") == version:
+                        catalog = {"columns": snapshot["columns"], "content_types": snapshot["content_types"]}
+                    else:
+                        catalog = self.introspect()
+                        self.write_catalog_snapshot(catalog, version)
+
+                    self._catalog = catalog
+
+        return self._catalog
+
     @property
     def table_names(self) -> list[str]:
         if not self.__table_names:
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                  SELECT tablename
-                    FROM pg_catalog.pg_tables
-                   WHERE schemaname = 'public'
-                """)
-
-                db_table_names  = [row[0] for row in cursor.fetchall()]
-
             self.__table_names = list({
                 self._db_table_name_map[name]
-                for name in db_table_names
+                for name in self.catalog["columns"]
                 if name in self._db_table_name_map
             })
 
@@ -169,23 +280,30 @@ class PostgreSQLDatabase(Database):
     @property
     def schema(self) -> dict:
         if not self.__schema:
-            schema_path = Path("data/database_specifications/database_schema.json")
-            with open(schema_path, 'r') as file:
-                self.__schema = json.load(file)
+            with self._lock:
+                if not self.__schema:
+                    schema_path = Path("data/database_specifications/database_schema.json")
+                    with open(schema_path, 'r') as file:
+                        self.__schema = json.load(file)
 
         return self.__schema
 
     @property
     def schema_graph(self) -> Graph:
+        """
+        The schema as a frozen graph, shared by all requests. Searches must
+        keep their state local to the call (see `libs.algorithms.a_star_path`).
+        """
         if self.__schema_graph is None:
-            graph = Graph()
-
-            for table_name, value in self.schema.items():
-                graph.add_node(table_name, value)
+            with self._lock:
+                if self.__schema_graph is None:
+                    graph = Graph()
 
-            self.__schema_graph = graph
+                    for table_name, value in self.schema.items():
+                        graph.add_node(table_name, value)
 
-        self.__schema_graph.reset()
+                    graph.freeze()
+                    self.__schema_graph = graph
 
         return self.__schema_graph
 
@@ -195,8 +313,7 @@ class PostgreSQLDatabase(Database):
 
     def __getattr__(self, table_name: str) -> Table:
         if not self._is_initialized:
-            self.initialize()
-            self._is_initialized = True
+            self.initialize_once()
 
         try:
             return object.__getattribute__(self, table_name)
@@ -1,13 +1,22 @@
 
-from components.graphs import Node
+import logging
+import threading
+from typing import Optional, Sequence
+
+from components.dataclasses import RequestContext
+from components.graphs import Graph, Node
 from components.graphs.segments import ChainSegment, IntermediateSegment, Segment
 from components.processors import Query
 from components.sources import Source
 from libs.algorithms import a_star
+from libs.strings import format_str
+from libs.tracing import span, traced
+from services.cache.dependencies import CacheDependencies
 from services.data import DataService
 from services.database import DatabaseService
 from services.processing import TransformationService
-from services.rest import RestService
+
+logger = logging.getLogger("django")
 
 @DataService.register_source("Database:Default")
 class RelationalDatabaseSource(Source):
@@ -16,47 +25,100 @@ class RelationalDatabaseSource(Source):
     def __init__(self, label="Database") -> None:
         self.label = label
         self.database = DatabaseService.get_database()
+        self._path_plans: dict[tuple[str, str], list[Segment]] = {}
+        self._planned = False
+        self._search_graph: Optional[Graph] = None
+        self._lock = threading.Lock()
 
-    def fetch(self, request_key: str):
+    def fetch(self, request_context: RequestContext):
         """
         Fetch data from target table by finding and traversing the relationship
         path from source table.
 
         Target table: Whose records will be returned
         Source table: The table where filters are applied (defaults to target)
-        Filter params: Query filters applied to the source table
+        Filters: Query filters applied to the source table, as fitted by the
+            query builder when the request was parsed
 
         Args:
-            request_key (str): Key for getting access to the applicable request.
+            request_context (RequestContext): The applicable request.
 
         Returns:
             queryset (QuerySet): A queryset for the target records
         """
+        parsed = request_context.parsed
+        target = parsed.target
         try:
-            filter_params = RestService.get_query_parmeters(request_key)
+            request_key = request_context.key
 
-            target = RestService.get_command_target(request_key)
-            target_tables = target.split('-')
-            target = target_tables[0]
-            source = target_tables[1] if len(target_tables) == 2 else target
+            with span("path_plan"):
+                optimized_path = self.get_path_plan(parsed.source, target)
 
-            graph = self.database.schema_graph
-            path = a_star(graph, source, target)
-            optimized_path = self.optimize_path(path)
-            queryset = self.execute_path(source, optimized_path, filter_params, request_key)
+            queryset = self.compile_path(optimized_path, parsed.filters, request_key)
+            if queryset is None:
+                queryset = self.execute_path(parsed.source, optimized_path, parsed.filters, request_key)
 
             post_processor = TransformationService.get_processor(f"Get:{target}")
-            data = post_processor.transform(queryset, request_key=request_key)
+            data = post_processor.transform(queryset, request_context=request_context)
 
-        except ValueError:
-            print(f"The target specified is invalid: {target}")
+        except ValueError as error:
+            # The view answers with the error: an invalid request, not a failure
+            logger.warning(f"The target specified is invalid: {target} ({error})")
+            raise
         except Exception as e:
             print(f"Unable to process request: {e}")
             raise e
 
         return data
 
-    def optimize_path(self, path: list[Node]) -> list[Segment]:
+    def plan_paths(self) -> dict[tuple[str, str], list[Segment]]:
+        """
+        Builds the path plan index: the optimized segments for every
+        (source, target) pair of models in the database schema.
+
+        The schema only changes on deploy, so the index is built once (by the
+        boot phase) and per-request planning is reduced to a lookup. Pairs
+        that cannot be planned are left out of the index.
+        """
+        if self._planned:
+            return self._path_plans
+
+        with self._lock:
+            if not self._planned:
+                model_names = list(self.database.schema)
+
+                # Publish the index only once it is complete
+                path_plans = dict(self._path_plans)
+                for source in model_names:
+                    for target in model_names:
+                        if (source, target) not in path_plans:
+                            plan = self._plan_path(source, target)
+                            if plan is not None:
+                                path_plans[(source, target)] = plan
+
+                self._path_plans = path_plans
+                self._planned = True
+
+        return self._path_plans
+
+    def get_path_plan(self, source: str, target: str) -> list[Segment]:
+        """
+        Returns the optimized segments from the source to the target model,
+        planned on first use if the index isn't built yet
+        """
+        plan = self._path_plans.get((source, target))
+        if plan is None and not self._planned:
+            with self._lock:
+                plan = self._path_plans.get((source, target)) or self._plan_path(source, target)
+                if plan is not None:
+                    self._path_plans = {**self._path_plans, (source, target): plan}
+
+        if plan is None:
+            raise ValueError(f"No path from '{source}' to '{target}' in the database schema.")
+
+        return plan
+
+    def optimize_path(self, path: Sequence[Node]) -> list[Segment]:
         """
         Converts raw A* path into optimized segments.
         Returns list of PathSegment objects (chain or intermediate)
@@ -65,18 +127,19 @@ class RelationalDatabaseSource(Source):
         current_chain: list[Node] = []
 
         for i, node in enumerate(path):
-            node_table = self.database.get(model_name=node.name)
+            node_schema = self.database.schema.get(node.name, {})
 
-            if node_table.table_type == 'intermediate':
+            if node_schema.get("type") == 'intermediate':
                 if current_chain:
                     segments.append(ChainSegment(current_chain, path))
                     current_chain = []
 
+                # The path runs from the target back to the source
                 segments.append(IntermediateSegment(
                     nodes=[
-                        path[i+1] if i > 0 else None,
+                        path[i+1] if i < len(path)-1 else None,
                         node,
-                        path[i-1] if i < len(path)-1 else None
+                        path[i-1] if i > 0 else None
                     ],
                     path=path
                 ))
@@ -88,13 +151,86 @@ class RelationalDatabaseSource(Source):
 
         return segments
 
-    def execute_path(self, source_table_name: str, segments: list[Segment], parameters: dict, request_key: str):
+    def _plan_path(self, source: str, target: str) -> Optional[list[Segment]]:
+        """Plans the segments of a pair, None if the pair cannot be planned"""
+        if source not in self.database.schema or target not in self.database.schema:
+            return None
+
+        try:
+            with span("a_star"):
+                path = self._search(source, target)
+            with span("optimize_path"):
+                return self.optimize_path(path)
+        except (KeyError, IndexError) as error:
+            logger.warning(f"Unable to plan the path from '{source}' to '{target}': {error!r}")
+            return None
+
+    def _search(self, source: str, target: str) -> tuple[Node, ...]:
+        """
+        The path of a pair as found by a_star, the search the plans have
+        always followed (a_star_path breaks ties differently, which changes
+        the tables joined for some pairs). a_star keeps its state on the
+        nodes: it runs on a graph of its own, under the lock, and the path is
+        made of the nodes of the shared schema graph.
+        """
+        if self._search_graph is None:
+            self._search_graph = Graph()
+            for table_name, value in self.database.schema.items():
+                self._search_graph.add_node(table_name, value)
+
+        self._search_graph.reset()
+        schema_graph = self.database.schema_graph
+
+        return tuple(schema_graph.get_node(node.name) for node in a_star(self._search_graph, source, target))
+
+    @traced("execute_path")
+    def execute_path(self, source_table_name: str, segments: list[Segment], query: dict, request_key: str):
         """Execute the optimized path segments"""
-        builder = Query.get_builder()
-        query = builder.fit(parameters)
         queryset = self.database.get(model_name=source_table_name).filter(query, request_key)
 
         for segment in reversed(segments):
             queryset = segment.execute(queryset, request_key)
 
-        return queryset
\ No newline at end of file
+        return queryset
+
+    @traced("compile_path")
+    def compile_path(self, segments: list[Segment], query: dict, request_key: str):
+        """
+        Compiles the optimized path segments into a single joined queryset of
+        the target: one round trip instead of a nested subquery per segment.
+
+        Returns None when a hop of the path cannot be expressed as a join.
+        """
+        path = segments[0].path if segments else ()
+        if not path:
+            return None
+
+        builder = Query.get_builder("Path")
+        target_query = builder.fit(query, path=path)
+        if target_query is None:
+            return None
+
+        # The joined tables aren't stored per request: record the dependencies
+        for node in path:
+            CacheDependencies.touch(request_key, node.name)
+
+        # Processors read the (lazy) querysets of the intermediate tables on the path
+        for i in range(1, len(path)):
+            table = self.database.get(model_name=path[i].name)
+            if table.table_type != "intermediate":
+                continue
+
+            intermediate_query = builder.fit(query, path=path[i:])
+            if intermediate_query is None:
+                continue
+
+            intermediate_qs = table.filter(intermediate_query)
+            if path[i].foreign_key_to(path[i - 1].name) == "object_id":
+                successor_table = self.database.get(model_name=path[i - 1].name)
+                intermediate_qs = intermediate_qs.filter(content_type__model=format_str(successor_table.model_name))
+
+            table.set_queryset(request_key, intermediate_qs)
+
+        target_table = self.database.get(model_name=path[0].name)
+
+        return target_table.filter(target_query, request_key)
@@ -5,29 +5,34 @@ Handles table operations.
 """
 
 import json
+from collections import namedtuple
+from contextlib import contextmanager
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from django.db import models, connection
-from django.forms.models import model_to_dict
+from django.db import models, connection, transaction
+from django.utils import timezone
 from typing import cast, Type, TypeVar, Optional
 
 from onit.constants import EMPTY_QUERYSET
 from components.dataclasses import TableField
+from libs.querysets import QuerysetRegistry
+from services.cache.dependencies import CacheDependencies
 
 T = TypeVar("T", bound=models.Model)
 
 class Table:
     """A wrapper class for relational database tables"""
 
-    def __init__(self, table_name, db_table_name, model: Optional[Type[T]]):
+    # Rows written per statement by the bulk operations
+    bulk_batch_size = 500
+
+    def __init__(self, table_name, db_table_name, model: Optional[Type[T]], field_names: Optional[list[str]] = None):
         self.table_name = table_name
         self.__model_name: str = ""
         self.__db_table_name: str = db_table_name
         self.__data_model: Optional[Type[models.Model]] = model
-        self.__field_names = []
+        self.__field_names = list(field_names or [])
         self.__fields = []
-        self._querysets = {}
-        self.id = 0
-        self.key = ""
+        self.__record_type = None
         self.content_type_id = 0
 
         self.dependent_table = ""
@@ -43,16 +48,13 @@ class Table:
     ###########################################################################
 
     def create(self, item: dict) -> int:
-        """Creates an record in the database"""
+        """Creates an record in the database, returns its id"""
         if not self.data_model:
             raise ValueError(f"Cannot create new record for table {self.table_name} because its data model does not exist.")
 
         new_instance = self.data_model.objects.create(**item)
 
-        if new_instance:
-            self._populate_fields(model_to_dict(new_instance))
-
-        return self.id
+        return new_instance.pk
 
 
     def get(self, *args, **kwargs) -> Optional[models.Model]:
@@ -72,13 +74,7 @@ class Table:
         if args and 'pk' not in kwargs:
           kwargs['pk'] = args[0]
 
-        instance = self.data_model.objects.filter(**kwargs).first()
-        if not instance:
-            return None
-
-        self._populate_fields(model_to_dict(instance))
-
-        return instance
+        return self.data_model.objects.filter(**kwargs).first()
 
 
     def filter(self, query = {}, request_key = None, use_current = True, **kwargs) -> models.QuerySet:
@@ -98,8 +94,8 @@ class Table:
 
         # If provided, use request key to lookup the current (stored) queryset
         if request_key and use_current:
-            current = self.get_queryset(request_key, reset=False)
-            if current:
+            current = QuerysetRegistry.get(request_key, self.model_name)
+            if current is not None:
                 return current
 
         # Apply optimization: Pre-select related objects
@@ -110,10 +106,10 @@ class Table:
         include, exclude = {}, {}
         if query:
             if isinstance(query.get("include"), dict) or isinstance(query.get("exclude"), dict):
-                include = query.get("include", {})
+                include = dict(query.get("include", {}))
                 exclude = query.get("exclude", {})
             else:
-                include = query
+                include = dict(query)
 
         # Allow to filter using keyword arguments
         filtering_kwargs = {k: v for k, v in kwargs.items()}
@@ -146,22 +142,23 @@ class Table:
             Model: The updated model instance
         """
         try:
-            query.update(kwargs)
+            query = {**query, **kwargs}
             queryset = self.filter(query)
 
-            if not queryset:
+            # Evaluated once: two records are enough to tell it is not unique
+            instances = list(queryset if allow_multiple_updates else queryset[:2])
+
+            if not instances:
                 raise ObjectDoesNotExist
 
-            if len(list(queryset)) > 1 and not allow_multiple_updates:
+            if len(instances) > 1 and not allow_multiple_updates:
                 raise MultipleObjectsReturned
 
-            for instance in queryset:
+            for instance in instances:
                 for key, value in item.items():
                     setattr(instance, key, value)
                 instance.save()
 
-            self._populate_fields(item)
-
             return queryset
 
         except ObjectDoesNotExist as error:
@@ -182,16 +179,18 @@ class Table:
         """
 
         try:
-            query.update(kwargs)
+            query = {**query, **kwargs}
             queryset = self.filter(query)
 
-            if not queryset:
+            instances = list(queryset if allow_multiple_deletions else queryset[:2])
+
+            if not instances:
                 raise ObjectDoesNotExist
 
-            if len(list(queryset)) > 1 and not allow_multiple_deletions:
+            if len(instances) > 1 and not allow_multiple_deletions:
                 raise MultipleObjectsReturned
 
-            for item in queryset:
+            for item in instances:
                 item.delete()
 
         except ObjectDoesNotExist as error:
@@ -221,13 +220,9 @@ class Table:
             by = list(by)
 
         filtering_kwargs = {k: v for k, v in kwargs.items() if k in self.field_names}
-        query.update(filtering_kwargs)
+        query = {**query, **filtering_kwargs}
 
-        instance = self.filter(query).order_by(*by).first()
-        if instance:
-            self._populate_fields(model_to_dict(instance))
-
-        return instance
+        return self.filter(query).order_by(*by).first()
 
 
     def last(self, query={}, by=[], **kwargs):
@@ -241,13 +236,9 @@ class Table:
             by = list(by)
 
         filtering_kwargs = {k: v for k, v in kwargs.items() if k in self.field_names}
-        query.update(filtering_kwargs)
-
-        instance = self.filter(query).order_by(*by).last()
-        if instance:
-            self._populate_fields(model_to_dict(instance))
+        query = {**query, **filtering_kwargs}
 
-        return instance
+        return self.filter(query).order_by(*by).last()
 
     def none(self):
         """
@@ -255,6 +246,197 @@ class Table:
         """
         return EMPTY_QUERYSET
 
+    ###########################################################################
+    #                             BULK OPERATIONS                             #
+    ###########################################################################
+
+    def bulk_create(self, items: list[dict], batch_size: Optional[int] = None) -> list[int]:
+        """
+        Creates records in batches of INSERT statements, returns their ids
+        (RETURNING). Unlike create, the save() of the model is not called and
+        no signal is sent: the records of a model overriding save() (e.g. to
+        set default values) are created one at a time instead.
+
+        Args:
+            items (list[dict]): The records to create
+            batch_size (int): The records per statement (default: bulk_batch_size)
+
+        Returns:
+            list: The ids of the records, in the order of the items
+        """
+        if not self.data_model:
+            raise ValueError(f"Cannot create new records for table {self.table_name} because its data model does not exist.")
+
+        if not items:
+            return []
+
+        if self.data_model.save is not models.Model.save:
+            with self._bulk_transaction():
+                return [self.data_model.objects.create(**item).pk for item in items]
+
+        with self._bulk_transaction():
+            instances = self.data_model.objects.bulk_create(
+                [self.data_model(**item) for item in items],
+                batch_size=batch_size or self.bulk_batch_size
+            )
+
+        return [instance.pk for instance in instances]
+
+    def bulk_update(self, items: list[dict], batch_size: Optional[int] = None) -> int:
+        """
+        Updates records by id in batches: each item holds the id of its
+        record and the values to set. The save() of the model is not called
+        and no signal is sent, the modified field (if any) is stamped here.
+
+        Args:
+            items (list[dict]): The records to update, with their id
+            batch_size (int): The records per statement (default: bulk_batch_size)
+
+        Returns:
+            int: The number of records updated
+        """
+        if not self.data_model or not items:
+            return 0
+
+        field_names = list(dict.fromkeys(key for item in items for key in item if key not in ("id", "pk")))
+        modified_field = self.modified_field
+        if modified_field and modified_field not in field_names:
+            field_names.append(modified_field)
+
+        if not field_names:
+            return 0
+
+        # Ids may come as strings (e.g. from a JSON body)
+        pk_field = self.data_model._meta.pk
+        ids = [pk_field.to_python(item.get("id", item.get("pk"))) for item in items]
+
+        batch_size = batch_size or self.bulk_batch_size
+        now = timezone.now()
+        updated = 0
+
+        with self._bulk_transaction():
+            for start in range(0, len(items), batch_size):
+                batch_ids = ids[start:start + batch_size]
+                instances = self.data_model.objects.in_bulk(batch_ids)
+                if len(instances) < len(set(batch_ids)):
+                    raise ValueError("The record to update was not found.")
+
+                for pk, item in zip(batch_ids, items[start:start + batch_size]):
+                    instance = instances[pk]
+                    for key, value in item.items():
+                        if key not in ("id", "pk"):
+                            setattr(instance, key, value)
+                    if modified_field and modified_field not in item:
+                        setattr(instance, modified_field, now)
+
+                updated += self.data_model.objects.bulk_update(list(instances.values()), field_names)
+
+        return updated
+
+    def update_many(self, item: dict, query={}, **kwargs) -> int:
+        """
+        Sets the same values on every record matching the query, in a single
+        UPDATE statement (save() is not called, no signal is sent).
+
+        Args:
+            item (dict): The values to set
+            query (dict): The query to find the records to update
+
+        Returns:
+            int: The number of records updated
+        """
+        if not self.data_model or not item:
+            return 0
+
+        modified_field = self.modified_field
+        if modified_field and modified_field not in item:
+            item = {**item, modified_field: timezone.now()}
+
+        # The filtered queryset is distinct, which UPDATE doesn't support
+        matches = self.filter({**query, **kwargs}).values("pk")
+        with self._bulk_transaction():
+            updated = self.data_model.objects.filter(pk__in=matches).update(**item)
+
+        return updated
+
+    def delete_many(self, query={}, batch_size: Optional[int] = None, **kwargs) -> int:
+        """
+        Deletes every record matching the query, in batches of DELETE
+        statements (with their cascades).
+
+        Args:
+            query (dict): The query to find the records to delete
+            batch_size (int): The records per statement (default: bulk_batch_size)
+
+        Returns:
+            int: The number of records deleted from the table
+        """
+        if not self.data_model:
+            return 0
+
+        batch_size = batch_size or self.bulk_batch_size
+        deleted = 0
+
+        with self._bulk_transaction():
+            # The ids are read in the same transaction as the deletes
+            ids = list(self.filter({**query, **kwargs}).values_list("pk", flat=True))
+            for start in range(0, len(ids), batch_size):
+                _, per_model = self.data_model.objects.filter(pk__in=ids[start:start + batch_size]).delete()
+                deleted += per_model.get(self.data_model._meta.label, 0)
+
+        return deleted
+
+    ###########################################################################
+    #                                 ROW API                                 #
+    ###########################################################################
+
+    def rows(self, query={}, by=[], **kwargs) -> list[tuple]:
+        """
+        Gets multiple records as immutable rows (named tuples of the columns,
+        e.g. `feature_id` for a foreign key): no model instances are built
+        and the table is left untouched, so it can serve concurrent requests.
+
+        Args:
+            query (dict): The query to filter the records
+            by (list): The fields to order the records by
+
+        Returns:
+            list: The rows of the records
+        """
+        if not self.data_model:
+            return []
+
+        return [self.record_type._make(values) for values in self._values(query, by, **kwargs)]
+
+    def get_row(self, *args, **kwargs) -> Optional[tuple]:
+        """
+        Gets a record as an immutable row.
+
+        Args:
+            - 1 positional argument (optional, int): Assumed as the primary key
+            - Any number of keyword arguments: Fields to filter on
+        """
+        if args and 'pk' not in kwargs:
+            kwargs['pk'] = args[0]
+
+        return self.first_row(**kwargs)
+
+    def first_row(self, query={}, by=[], **kwargs) -> Optional[tuple]:
+        """Gets the first record, ordered by 1 or more fields, as an immutable row"""
+        if not self.data_model:
+            return None
+
+        values = self._values(query, by, **kwargs).first()
+        return self.record_type._make(values) if values is not None else None
+
+    def last_row(self, query={}, by=[], **kwargs) -> Optional[tuple]:
+        """Gets the last record, ordered by 1 or more fields, as an immutable row"""
+        if not self.data_model:
+            return None
+
+        values = self._values(query, by, **kwargs).last()
+        return self.record_type._make(values) if values is not None else None
+
     ###########################################################################
     #                             PUBLIC METHODS                              #
     ###########################################################################
@@ -269,17 +451,23 @@ class Table:
         """
         Returns the queryset corresponding to the hash key. Will first check if
         it exists, otherwise if reset is True, will return a full queryset
-        (for all records).
+        (for all records). Querysets are kept until the response of the
+        request is sent (see QuerysetRegistry).
         """
         if not self.data_model:
             return cast(models.QuerySet, EMPTY_QUERYSET)
 
-        if self._querysets.get(request_key, None):
-            return self._querysets[request_key]
+        CacheDependencies.touch(request_key, self.model_name)
+
+        # Compare to None: the truth value of a queryset evaluates it
+        current = QuerysetRegistry.get(request_key, self.model_name)
+        if current is not None:
+            return current
 
         if reset:
-            self.set_queryset(request_key, reset=True)
-            return self._querysets[request_key]
+            queryset = self.data_model.objects.all()
+            QuerysetRegistry.set(request_key, self.model_name, queryset)
+            return queryset
 
         return self.data_model.objects.none()
 
@@ -290,19 +478,29 @@ class Table:
         if not self.data_model:
             return
 
+        # The response of the request depends on this table
+        CacheDependencies.touch(request_key, self.model_name)
+
         # overwrite mode
-        if queryset:
-            self._querysets[request_key] = queryset
+        if queryset is not None:
+            QuerysetRegistry.set(request_key, self.model_name, queryset)
             return
 
         # clear mode
         if reset:
-            self._querysets[request_key] = None
-            self._querysets[request_key] = self.data_model.objects.all()
+            QuerysetRegistry.set(request_key, self.model_name, self.data_model.objects.all())
 
         # refine queryset
         if filter_params:
-            self._querysets[request_key] = self._querysets[request_key].filter(**filter_params)
+            current = self.get_queryset(request_key)
+            QuerysetRegistry.set(request_key, self.model_name, current.filter(**filter_params))
+
+    def clear_queryset(self, request_key: str) -> None:
+        """
+        Method to drop the queryset of the request key (and its result cache)
+        before the response is sent.
+        """
+        QuerysetRegistry.discard(request_key, self.model_name)
 
     ###########################################################################
     #                            PRIVATE METHODS                              #
@@ -327,9 +525,6 @@ class Table:
             )
             self.__fields.append(field)
 
-            # Initialize all field attributes as None. Will be set when get() or update()
-            setattr(self, field_name, None)
-
     def _optimize(self, queryset):
         select_related_fields = []
         prefetch_related_fields = []
@@ -347,10 +542,26 @@ class Table:
 
         return queryset
 
-    def _populate_fields(self, item: dict):
-        for field in self.field_names:
-            if field in item:
-                setattr(self, field, item[field])
+    @contextmanager
+    def _bulk_transaction(self):
+        """
+        The transaction of a bulk operation. Bulk writes send no signals:
+        the cached responses read from the table are evicted once it commits,
+        together with those of the rows deleted one signal at a time.
+        """
+        from services.cache.cache import CacheService
+
+        with CacheService.merged_invalidations(), transaction.atomic():
+            yield
+            CacheService.invalidate_on_commit([self.data_model._meta.object_name])
+
+    def _values(self, query: dict, by: list, **kwargs) -> models.QuerySet:
+        """The values of the columns of the filtered records, without the related objects"""
+        queryset = self.filter(query, **kwargs).select_related(None).prefetch_related(None)
+        if by:
+            queryset = queryset.order_by(*by)
+
+        return queryset.values_list(*self.record_type._fields)
 
     ###########################################################################
     #                               PROPERTIES                                #
@@ -359,7 +570,8 @@ class Table:
     @property
     def field_names(self) -> list[str]:
         """
-        Property to get the field names of the table
+        Property to get the field names of the table, as read from the
+        database catalog (queried here only if the catalog has none)
         """
         if not self.__field_names:
             with connection.cursor() as cursor:
@@ -377,6 +589,29 @@ class Table:
     def fields(self) -> list[TableField]:
         return self.__fields
 
+    @property
+    def record_type(self) -> type:
+        """
+        Property to get the row type of the table: a named tuple of its
+        columns (built once, rows are tuples without a per-row dict)
+        """
+        if self.__record_type is None:
+            columns = [field.attname for field in self.data_model._meta.concrete_fields]
+            self.__record_type = namedtuple(f"{self.data_model.__name__}Row", columns)
+
+        return self.__record_type
+
+    @property
+    def modified_field(self) -> Optional[str]:
+        """
+        Property to get the field updated on every save (auto_now), e.g. last_update
+        """
+        for field in self.fields:
+            if isinstance(field.model, models.DateTimeField) and field.model.auto_now:
+                return field.name
+
+        return None
+
     @property
     def data_model(self) -> Optional[Type[models.Model]]:
         return self.__data_model
@@ -404,9 +639,6 @@ class Table:
     def __str__(self):
         return f"{self.table_name} ({self.model_name})"
 
-    def __dict__(self):
-        return {name: getattr(self, name) for name in self.field_names}
-
     def __repr__(self):
         table_details = {
             "name": self.table_name,
@@ -0,0 +1,33 @@
+"""
+Gunicorn server hooks for onit project.
+
+Gunicorn reads this file from the working directory. The command line
+options (Procfile) are left as they are.
+"""
+
+import os
+import uuid
+
+
+def on_starting(server):
+    """
+    Runs in the master. The workers of this run merge their collected paths
+    into one manifest, which replaces the manifest of the previous run.
+    """
+    os.environ["CACHE_WARMUP_RUN"] = uuid.uuid4().hex
+
+
+def worker_exit(server, worker):
+    """
+    Runs in each worker as it exits: leaves the paths it served to the cache
+    warm-up of the next run. Not in the master, which (with --preload) forked
+    the workers and served no request itself.
+    """
+    from django.conf import settings
+
+    if not settings.configured or not settings.CACHE_WARMUP:
+        return
+
+    from services.cache.warmup import CacheWarmer
+
+    CacheWarmer.save_collected(settings.CACHE_WARMUP_TOP_N)
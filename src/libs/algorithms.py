@@ -2,13 +2,15 @@
 Library of algorithms
 """
 import heapq
+from typing import Callable
 
-from components.graphs import Graph, Node
+from components.graphs import Graph, GraphTopology, Node
 
 
 def dijkstra(graph: Graph, start, target) -> list[Node]:
     """
     Implementation of Dijkstra's algorithm to find the shortest path between two nodes.
+    The search state is stored on the graph nodes, use `dijkstra_path` on shared graphs.
 
     Args:
         graph (Graph): The graph containing the two nodes.
@@ -63,7 +65,8 @@ def dijkstra(graph: Graph, start, target) -> list[Node]:
 
 def a_star(graph: Graph, start, target) -> list[Node]:
     """
-    Implementation of A* algorithm to find the shortest path between two nodes:
+    Implementation of A* algorithm to find the shortest path between two nodes.
+    The search state is stored on the graph nodes, use `a_star_path` on shared graphs:
     **Cost, f(n) = g(n) + h(n)**
 
     * **Path Cost, g(n)**:
@@ -105,7 +108,9 @@ def a_star(graph: Graph, start, target) -> list[Node]:
 
         current_cost = current_node.cost
         visited.add(current_node.name)
-        unvisited_neighbours = set(current_node.neighbours) - visited
+
+        # In schema order: the order of a set of names varies with the hash seed
+        unvisited_neighbours = [name for name in current_node.neighbours if name not in visited]
 
         for neighbour_name in unvisited_neighbours:
             neighbour_node = graph.get_node(neighbour_name)
@@ -125,3 +130,97 @@ def a_star(graph: Graph, start, target) -> list[Node]:
         current_node = current_node.predecessor
 
     return path
+
+
+def dijkstra_path(graph: Graph, start, target) -> tuple[Node, ...]:
+    """
+    Dijkstra's algorithm on the graph topology. The search state is local to
+    the call and the graph is left untouched.
+
+    Args:
+        graph (Graph): The graph containing the two nodes.
+        start (str): The starting node identifier.
+        target (str): The target node identifier.
+
+    Returns:
+        path (tuple[Node]): The nodes on the shortest path, from the target back to the start.
+    """
+    return _best_first_search(graph.topology, start, target, lambda node, target_node: 0)
+
+
+def a_star_path(graph: Graph, start, target) -> tuple[Node, ...]:
+    """
+    A* on the graph topology, with the same height heuristic as `a_star`.
+    The search state is local to the call and the graph is left untouched.
+
+    Args:
+        graph (Graph): The graph containing the two nodes.
+        start (str): The starting node identifier.
+        target (str): The target node identifier.
+
+    Returns:
+        path (tuple[Node]): The nodes on the shortest path, from the target back to the start.
+    """
+    topology = graph.topology
+
+    def heuristic(node, target_node):
+        return abs(topology.heights[target_node] - topology.heights[node])
+
+    return _best_first_search(topology, start, target, heuristic)
+
+
+def _best_first_search(
+    topology: GraphTopology,
+    start,
+    target,
+    heuristic: Callable[[int, int], float]
+) -> tuple[Node, ...]:
+    """
+    Best-first search over node positions. Costs and predecessors are kept in
+    arrays indexed by node position, so no node is mutated or copied.
+    """
+    start_index = topology.index[start]
+    target_index = topology.index[target]
+
+    size = len(topology.nodes)
+    costs = [float("infinity")] * size
+    predecessors = [-1] * size
+    visited = [False] * size
+
+    # Initialize the priority queue and add the start node
+    costs[start_index] = 0
+    priority_queue = [(heuristic(start_index, target_index), start_index)]
+
+    # Traverse the graph
+    while priority_queue:
+        _, current = heapq.heappop(priority_queue)
+
+        if current == target_index:
+            break
+
+        if visited[current]:
+            continue
+        visited[current] = True
+
+        for neighbour, distance in topology.adjacency[current]:
+            if visited[neighbour]:
+                continue
+
+            # Update the neighbour if a shorter path is found
+            path_cost = costs[current] + distance
+            if path_cost < costs[neighbour]:
+                costs[neighbour] = path_cost
+                predecessors[neighbour] = current
+                heapq.heappush(
+                    priority_queue,
+                    (path_cost + heuristic(neighbour, target_index), neighbour)
+                )
+
+    # Reconstruct the path
+    path = []
+    current = target_index
+    while current != -1:
+        path.append(topology.nodes[current])
+        current = predecessors[current]
+
+    return tuple(path)
@@ -0,0 +1,75 @@
+import sys
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any
+
+ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None))
+OPAQUE_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+
+def deep_sizeof(obj: Any, sample_size: int = 32, max_depth: int = 16) -> int:
+    """
+    Estimates the memory held by an object and everything it references.
+
+    The cost is bounded: containers larger than the sample size are measured
+    on evenly spaced items and the result is scaled to their length, which is
+    exact enough for the homogeneous lists of records the caches hold.
+    Objects referenced more than once are counted once.
+
+    Args:
+        obj (Any): The object to measure.
+        sample_size (int): The number of items measured per container.
+        max_depth (int): The depth below which objects are measured shallowly.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    return _deep_sizeof(obj, set(), sample_size, max_depth)
+
+
+def _deep_sizeof(obj: Any, seen: set[int], sample_size: int, depth: int) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if depth <= 0 or isinstance(obj, ATOMIC_TYPES + OPAQUE_TYPES):
+        return size
+
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        measure = lambda item: (
+            _deep_sizeof(item[0], seen, sample_size, depth - 1)
+            + _deep_sizeof(item[1], seen, sample_size, depth - 1)
+        )
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = list(obj)
+        measure = lambda item: _deep_sizeof(item, seen, sample_size, depth - 1)
+    else:
+        items = _attributes(obj)
+        measure = lambda item: _deep_sizeof(item, seen, sample_size, depth - 1)
+
+    if len(items) <= sample_size:
+        return size + sum(measure(item) for item in items)
+
+    step = len(items) / sample_size
+    sample = [items[int(i * step)] for i in range(sample_size)]
+
+    return size + sum(measure(item) for item in sample) * len(items) // sample_size
+
+
+def _attributes(obj: Any) -> list:
+    """Returns the attribute dictionary and slot values of an object"""
+    attributes = []
+
+    if hasattr(obj, "__dict__"):
+        attributes.append(obj.__dict__)
+
+    for cls in type(obj).__mro__:
+        slots = getattr(cls, "__slots__", ())
+        for slot in (slots,) if isinstance(slots, str) else slots:
+            if slot in ("__dict__", "__weakref__"):
+                continue
+            if hasattr(obj, slot):
+                attributes.append(getattr(obj, slot))
+
+    return attributes
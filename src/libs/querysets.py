@@ -0,0 +1,131 @@
+import logging
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger("django")
+
+
+class QuerysetRegistry:
+    """
+    The querysets of the requests in flight, by request key and table.
+
+    A request opens its key when its context is entered and releases it
+    when the response is sent: its querysets (and their result caches) are
+    dropped with the last request holding the key. Keys used outside of a
+    request context are never released: past max_requests keys, the oldest
+    unheld keys are evicted.
+    """
+
+    max_requests = 512
+
+    _lock = threading.Lock()
+    _querysets: dict[str, dict[str, Any]] = {}
+    _holders: dict[str, int] = {}
+
+    # Metrics
+    opened = 0
+    released = 0
+    evicted = 0
+    peak = 0
+
+    @staticmethod
+    def open(request_key: str) -> None:
+        """Holds the querysets of the key until it is released"""
+        with QuerysetRegistry._lock:
+            QuerysetRegistry._holders[request_key] = QuerysetRegistry._holders.get(request_key, 0) + 1
+            QuerysetRegistry.opened += 1
+
+    @staticmethod
+    def release(request_key: str) -> bool:
+        """
+        Lets go of the key. Returns True if no other request holds it, once
+        its querysets are dropped.
+        """
+        with QuerysetRegistry._lock:
+            holders = QuerysetRegistry._holders.get(request_key, 0) - 1
+            if holders > 0:
+                QuerysetRegistry._holders[request_key] = holders
+                return False
+
+            QuerysetRegistry._holders.pop(request_key, None)
+            if QuerysetRegistry._querysets.pop(request_key, None) is not None:
+                QuerysetRegistry.released += 1
+
+            return True
+
+    @staticmethod
+    def get(request_key: str, table_name: str) -> Optional[Any]:
+        with QuerysetRegistry._lock:
+            return QuerysetRegistry._querysets.get(request_key, {}).get(table_name)
+
+    @staticmethod
+    def set(request_key: str, table_name: str, queryset: Any) -> None:
+        with QuerysetRegistry._lock:
+            querysets = QuerysetRegistry._querysets.get(request_key)
+            if querysets is None:
+                querysets = QuerysetRegistry._querysets[request_key] = {}
+                QuerysetRegistry._evict(request_key)
+
+            querysets[table_name] = queryset
+            QuerysetRegistry.peak = max(QuerysetRegistry.peak, len(QuerysetRegistry._querysets))
+
+    @staticmethod
+    def discard(request_key: str, table_name: str) -> None:
+        with QuerysetRegistry._lock:
+            QuerysetRegistry._querysets.get(request_key, {}).pop(table_name, None)
+
+    @staticmethod
+    def clear() -> None:
+        with QuerysetRegistry._lock:
+            QuerysetRegistry._querysets.clear()
+            QuerysetRegistry._holders.clear()
+
+    @staticmethod
+    def get_metrics(labels: Optional[dict] = None) -> str:
+        """Returns the metrics of the registry in the Prometheus text format"""
+        label_string = ",".join(f'{name}="{value}"' for name, value in (labels or {}).items())
+        label_string = f"{{{label_string}}}" if label_string else ""
+
+        with QuerysetRegistry._lock:
+            samples = [
+                ("onit_queryset_registry_requests", "gauge", "Request keys holding querysets",
+                 len(QuerysetRegistry._querysets)),
+                ("onit_queryset_registry_querysets", "gauge", "Querysets held",
+                 sum(len(querysets) for querysets in QuerysetRegistry._querysets.values())),
+                ("onit_queryset_registry_peak_requests", "gauge", "Most request keys held at once",
+                 QuerysetRegistry.peak),
+                ("onit_queryset_registry_opened_total", "counter", "Request contexts opened",
+                 QuerysetRegistry.opened),
+                ("onit_queryset_registry_released_total", "counter", "Request keys released with their response",
+                 QuerysetRegistry.released),
+                ("onit_queryset_registry_evicted_total", "counter", "Request keys evicted past the cap",
+                 QuerysetRegistry.evicted),
+            ]
+
+        lines = []
+        for name, kind, description, value in samples:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}", f"{name}{label_string} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _evict(request_key: str) -> None:
+        """Evicts the oldest keys past the cap (but the new one), unheld keys first"""
+        querysets = QuerysetRegistry._querysets
+        excess = len(querysets) - QuerysetRegistry.max_requests
+        if excess <= 0:
+            return
+
+        holders = QuerysetRegistry._holders
+        evicted = [key for key in querysets if key not in holders and key != request_key][:excess]
+
+        # Only requests in flight left: the cap wins over the oldest of them
+        if len(evicted) < excess:
+            in_flight = [key for key in querysets if key in holders and key != request_key]
+            evicted += in_flight[:excess - len(evicted)]
+            logger.warning("Queryset registry full: evicted the querysets of requests in flight")
+
+        for key in evicted:
+            del querysets[key]
+
+        QuerysetRegistry.evicted += len(evicted)
@@ -0,0 +1,153 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Optional
+
+from django.db import connection
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+# Lists of placeholders (e.g. "IN (%s, %s)") and inlined numbers vary with the
+# data, not with the code that ran the query
+_PLACEHOLDER_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+class Trace:
+    """
+    The spans of one request, aggregated by name: the number of calls, the
+    time spent, the SQL queries run and the most run by a single call. Spans
+    nest, so a span includes the time and queries of the spans it encloses.
+
+    Queries can also be counted by shape (the SQL without its parameters)
+    under the innermost open span: a shape run again and again by the same
+    span is an N+1, a query per row of a loop.
+    """
+
+    __slots__ = ("started", "duration", "queries", "spans", "shapes", "count_shapes", "_stack")
+
+    def __init__(self, count_shapes: bool = True):
+        self.started = perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.spans: dict[str, list] = {}
+        self.shapes: Counter = Counter()
+        self.count_shapes = count_shapes
+        self._stack: list[str] = []
+
+    def add(self, name: str, duration: float, queries: int) -> None:
+        span = self.spans.setdefault(name, [0, 0.0, 0, 0])
+        span[0] += 1
+        span[1] += duration
+        span[2] += queries
+        span[3] = max(span[3], queries)
+
+    def count(self, sql: str) -> None:
+        """Counts a query, and its shape under the innermost open span"""
+        self.queries += 1
+        if self.count_shapes:
+            self.shapes[(self._stack[-1] if self._stack else "", sql_shape(sql))] += 1
+
+    def max_queries(self, name: str) -> int:
+        """The most queries run by a single call of the span"""
+        span = self.spans.get(name)
+        return span[3] if span else 0
+
+    def repeated_queries(self, threshold: int) -> list[tuple[str, str, int]]:
+        """The (span, shape, count) of the shapes run at least threshold times by a span"""
+        return [
+            (name, shape, count)
+            for (name, shape), count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def server_timing(self) -> str:
+        """The spans as a Server-Timing header value (durations in ms)"""
+        metrics = [_server_timing_metric("total", 1, self.duration, self.queries)]
+        metrics += [
+            _server_timing_metric(name, calls, duration, queries)
+            for name, (calls, duration, queries, _) in self.spans.items()
+        ]
+
+        return ", ".join(metrics)
+
+    def to_dict(self) -> dict:
+        return {
+            "duration_ms": round(self.duration * 1000, 3),
+            "queries": self.queries,
+            "spans": {
+                name: {
+                    "calls": calls,
+                    "duration_ms": round(duration * 1000, 3),
+                    "queries": queries,
+                    "max_queries": max_queries,
+                }
+                for name, (calls, duration, queries, max_queries) in self.spans.items()
+            },
+        }
+
+
+@contextmanager
+def trace(count_shapes: bool = True):
+    """
+    Traces the request processed in the block: the spans opened by the code
+    it calls (in this thread) are recorded on the yielded trace, and so are
+    the SQL queries run on the default database (by shape, if count_shapes).
+    """
+    current = Trace(count_shapes)
+    token = _current.set(current)
+
+    def count_query(execute, sql, params, many, context):
+        current.count(sql)
+        return execute(sql, params, many, context)
+
+    try:
+        with connection.execute_wrapper(count_query):
+            yield current
+    finally:
+        current.duration = perf_counter() - current.started
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str):
+    """Records the time and queries of the block on the current trace, if any"""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+
+    started, queries = perf_counter(), current.queries
+    current._stack.append(name)
+    try:
+        yield
+    finally:
+        current._stack.pop()
+        current.add(name, perf_counter() - started, current.queries - queries)
+
+
+def traced(name: str) -> Callable:
+    """Decorator recording each call of the function as a span"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def sql_shape(sql: str) -> str:
+    """The SQL of a query without the values that vary from row to row"""
+    return _NUMBER.sub("?", _PLACEHOLDER_LIST.sub("(...)", sql))
+
+
+def _server_timing_metric(name: str, calls: int, duration: float, queries: int) -> str:
+    # Metric names are tokens: e.g. "Get:Service" becomes "Get-Service"
+    token = re.sub(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]", "-", name)
+    description = f"{calls} calls, {queries} queries" if calls > 1 else f"{queries} queries"
+
+    return f'{token};dur={duration * 1000:.3f};desc="{description}"'
@@ -0,0 +1,57 @@
+"""
+Boot phase of the web server.
+
+Builds the state shared by every request (the database registry, the schema
+graph and path plans, the registered sources and processors, and the parsed
+specification files) once, when the WSGI application is loaded. With
+gunicorn --preload, that is in the master before it forks the workers:
+they inherit the state copy-on-write and serve their first request warm.
+"""
+
+import gc
+import logging
+from time import perf_counter
+from django.db import connections
+
+logger = logging.getLogger("django")
+
+
+def boot() -> None:
+    """Builds the shared state. Whatever fails is left to the first request."""
+    from libs.discovery import load_registered_implementations
+    from services.data import DataService
+    from services.database import DatabaseService
+    from services.query_budget import QueryBudgetService
+    from services.rest import RestService
+
+    started = perf_counter()
+    try:
+        database = DatabaseService.get_database()
+        database.initialize_once()
+        database.schema_graph
+
+        load_registered_implementations(package_name="components.sources")
+        load_registered_implementations(package_name="components.processors")
+        DataService.get_source("Database:Default").plan_paths()
+
+        DataService.get_commands()
+        RestService.get_control_parameters()
+        QueryBudgetService.get_budgets()
+    except Exception as error:
+        logger.warning(f"Boot phase incomplete, continuing lazily: {error}")
+        return
+
+    logger.info(f"Boot phase done in {perf_counter() - started:.2f}s")
+
+
+def prepare_fork() -> None:
+    """
+    Leaves the process ready to be forked: the database connections opened
+    while booting must not be shared by the workers, and the objects built
+    so far are moved out of the garbage collector's reach, so that its
+    passes don't write to (and copy) the pages the workers share.
+    """
+    connections.close_all()
+
+    gc.collect()
+    gc.freeze()
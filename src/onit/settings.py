@@ -98,20 +98,59 @@ WSGI_APPLICATION = "onit.wsgi.application"
 APPEND_SLASH = False
 SECURE_SSL_REDIRECT = False
 
+# Time spent per stage of the requests (path planning, queries, processors,
+# encoding): as a Server-Timing header, and as a JSON log line per request
+REQUEST_TRACING = config("REQUEST_TRACING", cast=bool, default=DEBUG)
+REQUEST_TRACING_LOG = config("REQUEST_TRACING_LOG", cast=bool, default=False)
+
+# Build the database registry, path plans, processors and specification files
+# when the WSGI application is loaded (onit/boot.py): before the fork, with
+# gunicorn --preload
+EAGER_BOOT = config("EAGER_BOOT", cast=bool, default=True)
+
+# Check the queries of the requests against their budgets
+# (data/api_specifications/query_budgets.json): log the overruns and the
+# N+1 queries, or raise rather than log
+QUERY_BUDGETS = config("QUERY_BUDGETS", cast=bool, default=DEBUG)
+QUERY_BUDGET_STRICT = config("QUERY_BUDGET_STRICT", cast=bool, default=False)
+
 ###############################################################################
 #                               Cache Settings                                #
 ###############################################################################
 
+# L1: in-process object cache per worker, L2: Redis shared by the workers.
+# Without REDIS_URL, each worker only has its L1.
 CACHES = {
     "default": {
-        "BACKEND": "services.cache.object_cache.ObjectCache"
+        "BACKEND": "services.cache.tiered_cache.TieredCache",
+        "LOCATION": config("REDIS_URL", cast=str, default=""),
+        "OPTIONS": {
+            "PREFIX": f"onit:{ENV}:cache",
+            "FILL_TIMEOUT": 10,
+        }
     }
 }
 
+# Replay the hot requests (data/api_specifications/warmup_manifest.json and
+# the paths collected by the previous process) when a worker boots
+CACHE_WARMUP = config("CACHE_WARMUP", cast=bool, default=False)
+CACHE_WARMUP_TOP_N = config("CACHE_WARMUP_TOP_N", cast=int, default=100)
+
+# Keep the cached responses in a local SQLite snapshot, so restarts come up warm.
+# Bump CACHE_SNAPSHOT_VERSION to discard it after data changes made outside the API
+CACHE_SNAPSHOT = config("CACHE_SNAPSHOT", cast=bool, default=False)
+CACHE_SNAPSHOT_PATH = config("CACHE_SNAPSHOT_PATH", cast=str, default=str(BASE_DIR / "data" / "cache" / "snapshot.sqlite3"))
+CACHE_SNAPSHOT_INTERVAL = config("CACHE_SNAPSHOT_INTERVAL", cast=int, default=60)
+CACHE_SNAPSHOT_VERSION = config("CACHE_SNAPSHOT_VERSION", cast=str, default="1")
+
 ###############################################################################
 #                              Database Settings                              #
 ###############################################################################
 
+# The columns of the tables and the content type ids, introspected once and
+# reused by the workers until the applied migrations change
+SCHEMA_SNAPSHOT_PATH = config("SCHEMA_SNAPSHOT_PATH", cast=str, default=str(BASE_DIR / "data" / "cache" / "schema_snapshot.json"))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -8,8 +8,28 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 """
 
 import os
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "onit.settings")
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Build the state shared by the requests before the workers are forked
+# (gunicorn --preload), so that each of them starts warm
+if settings.EAGER_BOOT:
+    from onit.boot import boot
+
+    boot()
+
+# Warm the cache up before the worker accepts traffic. Each worker leaves its
+# most requested paths to the next run when it exits (gunicorn.conf.py)
+if settings.CACHE_WARMUP:
+    from services.cache.warmup import CacheWarmer
+
+    CacheWarmer.warm_up()
+
+if settings.EAGER_BOOT:
+    from onit.boot import prepare_fork
+
+    prepare_fork()
\ No newline at end of file
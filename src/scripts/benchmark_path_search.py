@@ -0,0 +1,116 @@
+"""
+Micro-benchmark of the schema graph path searches.
+
+Compares `a_star` (state on the graph nodes, deep-copied predecessors) with
+`a_star_path` (state in arrays local to the search) on the production schema
+and on synthetic schemas.
+
+Usage (from src/):
+    python scripts/benchmark_path_search.py [--tables 500] [--pairs 50] [--repeat 3]
+"""
+
+import argparse
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from components.graphs import Graph
+from libs.algorithms import a_star, a_star_path
+
+SCHEMA_PATH = PROJECT_ROOT / "data/database_specifications/database_schema.json"
+
+
+def load_schema() -> dict:
+    with open(SCHEMA_PATH, "r") as file:
+        return json.load(file)
+
+
+def synthetic_schema(tables: int, seed: int = 0) -> dict:
+    """
+    Generates a connected schema with the shape of database_schema.json:
+    a spanning tree plus extra relations, symmetric foreign keys,
+    distances of 1-4 and heights of 1-5.
+    """
+    rng = random.Random(seed)
+    names = [f"Table{i}" for i in range(tables)]
+    schema = {
+        name: {"height": rng.randint(1, 5), "neighbours": [], "foreign_keys": {}}
+        for name in names
+    }
+
+    def relate(left, right):
+        if left == right or right in schema[left]["foreign_keys"]:
+            return
+        distance = rng.randint(1, 4)
+        for a, b in ((left, right), (right, left)):
+            schema[a]["neighbours"].append({"name": b, "distance": distance})
+            schema[a]["foreign_keys"][b] = f"{b.lower()}_set"
+
+    for i in range(1, tables):
+        relate(names[i], names[rng.randrange(i)])
+
+    for _ in range(tables):
+        relate(rng.choice(names), rng.choice(names))
+
+    return schema
+
+
+def build_graph(schema: dict) -> Graph:
+    graph = Graph()
+    for table_name, value in schema.items():
+        graph.add_node(table_name, value)
+
+    return graph
+
+
+def benchmark(label: str, schema: dict, pairs: int, repeat: int, seed: int = 0):
+    graph = build_graph(schema)
+    names = list(schema)
+    rng = random.Random(seed)
+    sample = [(rng.choice(names), rng.choice(names)) for _ in range(pairs)]
+
+    def current():
+        for source, target in sample:
+            graph.reset()
+            a_star(graph, source, target)
+
+    def local_state():
+        for source, target in sample:
+            a_star_path(graph, source, target)
+
+    # Build the topology outside the timings, it is built once per graph
+    _ = graph.topology
+
+    current_time = min(timeit.repeat(current, number=1, repeat=repeat)) / pairs
+    local_time = min(timeit.repeat(local_state, number=1, repeat=repeat)) / pairs
+
+    print(f"{label} ({len(names)} tables, {pairs} pairs)")
+    print(f"  a_star:      {current_time * 1e6:10.1f} us/search")
+    print(f"  a_star_path: {local_time * 1e6:10.1f} us/search")
+    print(f"  speed-up:    {current_time / local_time:10.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=500, help="Number of tables of the synthetic schemas")
+    parser.add_argument("--pairs", type=int, default=50, help="Number of (source, target) pairs per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the best is reported")
+    parser.add_argument("--schemas", type=int, default=3, help="Number of synthetic schemas")
+    arguments = parser.parse_args()
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100_000))
+
+    benchmark("Production schema", load_schema(), arguments.pairs, arguments.repeat)
+    for seed in range(arguments.schemas):
+        benchmark(
+            f"Synthetic schema #{seed}",
+            synthetic_schema(arguments.tables, seed),
+            arguments.pairs,
+            arguments.repeat,
+            seed
+        )
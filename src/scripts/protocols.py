@@ -38,8 +38,6 @@ def table_protocols():
 
             # Fields
             file.write("    table_name: str\n")
-            file.write("    id: int\n")
-            file.write("    key: str\n")
             file.write("    content_type_id: int\n")
             file.write("    dependent_table: str\n")
             file.write("    foreign_keys: dict[str, str]\n")
@@ -64,7 +62,16 @@ def table_protocols():
             file.write("    def get_related_name(self, neighbour: str) -> str | None:\n        '''Returns the foreign key facing the neighbour.'''\n        ...\n\n")
             file.write("    def get_queryset(self, request_key, reset=True) -> models.QuerySet | None:\n        '''Returns the queryset corresponding to the hash key. Will first check if it exists, otherwise if reset is True, will return a full queryset (for all records)'''\n        ...\n\n")
             file.write("    def set_queryset(self, request_key, queryset=None, filter_params=None, reset=False) -> None:\n        '''Method to handle specific queryset operations'''\n\n")
+            file.write("    def clear_queryset(self, request_key) -> None:\n        '''Method to drop the queryset of the request key'''\n\n")
+            file.write("    def rows(self, query={}, by=[], **kwargs) -> list[tuple]:\n        '''Gets multiple records as immutable rows'''\n        ...\n\n")
+            file.write("    def get_row(self, *args, **kwargs) -> tuple | None:\n        '''Gets a record as an immutable row'''\n        ...\n\n")
+            file.write("    def first_row(self, query={}, by=[], **kwargs) -> tuple | None:\n        '''Gets the first record as an immutable row'''\n        ...\n\n")
+            file.write("    def last_row(self, query={}, by=[], **kwargs) -> tuple | None:\n        '''Gets the last record as an immutable row'''\n        ...\n\n")
             file.write("    def update(self, item, query = {}, allow_multiple_updates=False, **kwargs) -> models.QuerySet:\n        '''Updates one or more records in the database'''\n        ...\n\n")
+            file.write("    def bulk_create(self, items, batch_size=None) -> list[int]:\n        '''Creates records in batches, returns their ids'''\n        ...\n\n")
+            file.write("    def bulk_update(self, items, batch_size=None) -> int:\n        '''Updates records by id in batches'''\n        ...\n\n")
+            file.write("    def update_many(self, item, query={}, **kwargs) -> int:\n        '''Sets the same values on every record matching the query'''\n        ...\n\n")
+            file.write("    def delete_many(self, query={}, batch_size=None, **kwargs) -> int:\n        '''Deletes every record matching the query, in batches'''\n        ...\n\n")
 
             # Properties
             file.write("    @property\n")
@@ -4,12 +4,46 @@ On It Cache Service
 Handles cache operations
 """
 
+import logging
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from time import time
 from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import connections, transaction
+from libs.tracing import span
+from services.cache.dependencies import CacheDependencies
+from services.cache.metrics import CacheMetrics
+from services.cache.snapshot import CacheSnapshot
+from services.configuration import ConfigurationService
+
+
+class Flight:
+    """A fill of a key in progress, awaited by the concurrent requests for it"""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
 
 
 class CacheService:
     """Handles cache operations"""
 
+    logger = logging.getLogger("django")
+
+    # Tells a miss from a cached empty result
+    MISSING = object()
+
+    _flights: dict[str, Flight] = {}
+    _flights_lock = threading.Lock()
+
+    # The tables collected by the merged_invalidations block of each thread
+    _merged = threading.local()
+
     @staticmethod
     def get_object(key):
         """
@@ -24,25 +58,268 @@ class CacheService:
         return cache.get(key)
 
     @staticmethod
-    def set_object(key, item):
+    def set_object(key, item, timeout=DEFAULT_TIMEOUT):
         """
         Sets an object in the cache.
 
         Args:
             key (str): A hashed representation of the request.
             value (object): The object to cache.
+            timeout (int): Seconds to live, defaults to the cache's timeout.
+        """
+        # A table read by the fill changed while it ran: the object may hold
+        # the rows from before the change
+        if CacheDependencies.is_outdated(key):
+            CacheDependencies.release(key)
+            return
+
+        cache.set(key, item, timeout)
+        tables = CacheDependencies.commit(key)
+        if tables is None:
+            cache.delete(key)
+            return
+
+        # A shared cache keeps the dependencies next to the object
+        set_dependencies = getattr(cache, "set_dependencies", None)
+        if set_dependencies and tables:
+            set_dependencies(key, tables)
+
+        # Only the regular objects are persisted: the snapshot has no notion
+        # of the shorter timeouts (e.g. negative results)
+        if timeout is DEFAULT_TIMEOUT:
+            CacheSnapshot.mark(key)
+
+    @staticmethod
+    def get_or_fill(key, fill, wait_timeout=30):
+        """
+        Gets an object from the cache, filling it on a miss.
+
+        Concurrent misses on a key are coalesced: the first request runs the
+        fill and the others wait for its result (or its error). A waiter that
+        times out runs the fill itself. An object older than
+        Cache:ObjectCacheMaxAge is stale: it is still served while one
+        background fill refreshes it.
+
+        Args:
+            key (str): A hashed representation of the request.
+            fill (callable): Returns the object and its timeout (0: not cached,
+                CacheService.negative_timeout() for negative results).
+            wait_timeout (float): Seconds to wait for a concurrent fill.
+
+        Returns:
+            object: The cached or filled object.
+        """
+        with span("cache"):
+            item = cache.get(key, CacheService.MISSING)
+            if item is CacheService.MISSING:
+                item = CacheService._restore(key)
+
+        if item is not CacheService.MISSING:
+            if CacheService.is_stale(item):
+                CacheService._refresh(key, fill)
+            return item
+
+        with CacheService._flights_lock:
+            flight = CacheService._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = CacheService._flights[key] = Flight()
+
+        if leader:
+            return CacheService._fly(key, fill, flight)
+
+        if not flight.done.wait(wait_timeout):
+            CacheService.logger.warning(f"Timed out waiting on the fill of {key}, filling it again")
+            item, _ = CacheService._fill(key, fill)
+            return item
+
+        if flight.error is not None:
+            raise flight.error
+
+        return flight.value
+
+    @staticmethod
+    def negative_timeout() -> int:
+        """
+        The time to live of negative results (empty or missing data): shorter
+        than for regular objects, as they are cheap to recompute and more
+        likely to change.
+        """
+        return int(ConfigurationService.get_parameter(
+            category="Cache", key="ObjectCacheNegativeTimeout"
+        ) or '60')
+
+    @staticmethod
+    def is_stale(item) -> bool:
+        """Method to determine if an object is older than Cache:ObjectCacheMaxAge"""
+        created_at = getattr(item, "created_at", None)
+        if created_at is None:
+            return False
+
+        max_age = int(ConfigurationService.get_parameter(
+            category="Cache", key="ObjectCacheMaxAge"
+        ) or '3600')
+
+        return time() - created_at > max_age
+
+    @staticmethod
+    def lock(key):
+        """
+        Returns a context manager holding the key while it is filled, so
+        concurrent misses on the key don't all compute it.
+
+        Args:
+            key (str): A hashed representation of the request.
+        """
+        lock = getattr(cache, "lock", None)
+        return lock(key) if lock else nullcontext()
+
+    @staticmethod
+    def invalidate_tables(table_names):
         """
-        cache.set(key, item)
+        Evicts the cached objects read from the tables, on every worker when
+        the cache backend is shared.
+
+        Args:
+            table_names (list[str]): The model names of the changed tables.
+        """
+        CacheSnapshot.delete_tables(table_names)
+
+        invalidate = getattr(cache, "invalidate_tables", None)
+        if invalidate:
+            invalidate(table_names)
+            return
+
+        for key in CacheDependencies.pop_keys(table_names):
+            cache.delete(key)
+
+    @staticmethod
+    def invalidate_on_commit(table_names):
+        """
+        Evicts the cached objects read from the tables once the current
+        transaction is committed (at once outside of a transaction): before,
+        a concurrent request could cache the old rows again. A rolled back
+        transaction drops its invalidations with it.
+
+        Args:
+            table_names (list[str]): The model names of the changed tables.
+        """
+        merged = getattr(CacheService._merged, "tables", None)
+        if merged is not None:
+            merged.update(table_names)
+            return
+
+        tables = sorted(set(table_names))
+        if tables:
+            transaction.on_commit(lambda: CacheService.invalidate_tables(tables))
+
+    @staticmethod
+    @contextmanager
+    def merged_invalidations():
+        """
+        Merges the invalidations of the block (e.g. one per deleted row) into
+        one, registered when the block exits. Nothing is registered if the
+        block raises: its transaction is rolled back.
+        """
+        outer = getattr(CacheService._merged, "tables", None)
+        tables = CacheService._merged.tables = set()
+        try:
+            yield
+        finally:
+            CacheService._merged.tables = outer
+
+        CacheService.invalidate_on_commit(tables)
 
     @staticmethod
     def clear_object_cache():
         """Method to clear the object cache"""
 
         cache.clear()
+        CacheDependencies.clear()
+        CacheSnapshot.clear()
+
+    @staticmethod
+    def _fly(key, fill, flight: Flight):
+        """Runs the fill of a flight and hands its result to the waiters"""
+        try:
+            with CacheService.lock(key):
+                # Filled by another worker while waiting on the lock?
+                item = cache.get(key, CacheService.MISSING)
+                if item is CacheService.MISSING or CacheService.is_stale(item):
+                    item, _ = CacheService._fill(key, fill)
+
+            flight.value = item
+            return item
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with CacheService._flights_lock:
+                CacheService._flights.pop(key, None)
+            flight.done.set()
+
+    @staticmethod
+    def _restore(key):
+        """Restores a response missed by the cache from the snapshot, with its dependencies"""
+        timeout = int(ConfigurationService.get_parameter(
+            category="Cache", key="ObjectCacheTimeout"
+        ) or '86400')
+
+        restored = CacheSnapshot.restore(key, max_age=timeout)
+        if restored is None:
+            return CacheService.MISSING
+
+        item, tables = restored
+        for table_name in tables:
+            CacheDependencies.touch(key, table_name)
+        CacheService.set_object(key, item)
+
+        return item
+
+    @staticmethod
+    def _fill(key, fill):
+        CacheDependencies.start(key)
+        try:
+            with span("fill"):
+                item, timeout = fill()
+            if timeout != 0:
+                CacheService.set_object(key, item, timeout)
+        finally:
+            CacheDependencies.finish(key)
+
+        return item, timeout
+
+    @staticmethod
+    def _refresh(key, fill):
+        """Refreshes a stale object in the background, unless a fill of the key is in flight"""
+        with CacheService._flights_lock:
+            if key in CacheService._flights:
+                return
+            flight = CacheService._flights[key] = Flight()
+
+        def refresh():
+            try:
+                CacheService._fly(key, fill, flight)
+            except Exception as error:
+                CacheService.logger.warning(f"Unable to refresh {key}: {error}")
+            finally:
+                connections.close_all()
+
+        threading.Thread(target=refresh, name=f"cache-refresh-{key}", daemon=True).start()
+
+    @staticmethod
+    def get_metrics() -> str:
+        """
+        Method to get the metrics of the cache of this worker in the Prometheus
+        text format (each worker keeps its own, labelled by its pid)
+        """
+        get_metrics = getattr(cache, "get_metrics", None)
+        if get_metrics is None:
+            return ""
+
+        return CacheMetrics.render(get_metrics({"worker": os.getpid()}))
 
     @staticmethod
     def print_info():
         """Method to print the cache info"""
         cache.print_info()
-        print(
-            f"Used memory: {cache.object_cache.storage} ({cache.object_cache.storage_threshold})")
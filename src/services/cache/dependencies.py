@@ -0,0 +1,138 @@
+"""
+On It Cache Service - CacheDependencies
+
+Tracks the tables each cached response was read from, so that a change to a
+table only evicts the responses that depend on it.
+"""
+
+import threading
+from typing import Optional
+
+
+class CacheDependencies:
+    """
+    Dependency index of the cached responses.
+
+    The tables read while a request is processed are pending under its key,
+    and are committed to the index only if its response is cached. The
+    index is kept per worker: each worker knows the responses it filled.
+
+    Every invalidation of a table bumps its generation. A fill records the
+    generation it started at, and its response is not cached if a table it
+    read was invalidated since: it may hold the rows from before the change.
+    """
+
+    _lock = threading.Lock()
+    _pending: dict[str, set[str]] = {}
+    _keys_by_table: dict[str, set[str]] = {}
+    _tables_by_key: dict[str, set[str]] = {}
+
+    _generation = 0
+    _invalidated: dict[str, int] = {}
+    _started: dict[str, int] = {}
+
+    @staticmethod
+    def start(key: str) -> None:
+        """Records the generation a fill of the key starts at (the earliest, for concurrent fills)"""
+        with CacheDependencies._lock:
+            CacheDependencies._started.setdefault(key, CacheDependencies._generation)
+
+    @staticmethod
+    def finish(key: str) -> None:
+        """Forgets the generation of a fill whose object was not cached"""
+        with CacheDependencies._lock:
+            CacheDependencies._started.pop(key, None)
+
+    @staticmethod
+    def touch(key: str, table_name: str) -> None:
+        """Records that the request reads the table"""
+        if not key or not table_name:
+            return
+
+        with CacheDependencies._lock:
+            CacheDependencies._pending.setdefault(key, set()).add(table_name)
+
+    @staticmethod
+    def is_outdated(key: str) -> bool:
+        """Whether a table read by the fill of the key was invalidated since it started"""
+        with CacheDependencies._lock:
+            return CacheDependencies._is_outdated(key)
+
+    @staticmethod
+    def commit(key: str) -> Optional[set[str]]:
+        """
+        Indexes the tables read by the request once its response is cached.
+        Returns the tables, for the cache backends sharing the index, or None
+        if the fill is outdated: its response must not stay cached.
+        """
+        with CacheDependencies._lock:
+            outdated = CacheDependencies._is_outdated(key)
+            CacheDependencies._started.pop(key, None)
+            tables = CacheDependencies._pending.pop(key, None)
+            if outdated:
+                return None
+            if not tables:
+                return set()
+
+            CacheDependencies._tables_by_key.setdefault(key, set()).update(tables)
+            for table_name in tables:
+                CacheDependencies._keys_by_table.setdefault(table_name, set()).add(key)
+
+            return tables
+
+    @staticmethod
+    def release(key: str) -> None:
+        """Drops the tables recorded for a request whose response was not cached"""
+        with CacheDependencies._lock:
+            CacheDependencies._pending.pop(key, None)
+            CacheDependencies._started.pop(key, None)
+
+    @staticmethod
+    def pop_keys(table_names) -> set[str]:
+        """
+        Returns the keys of the responses that read the tables, and forgets
+        them. The fills running meanwhile are outdated.
+        """
+        with CacheDependencies._lock:
+            CacheDependencies._generation += 1
+            for table_name in table_names:
+                CacheDependencies._invalidated[table_name] = CacheDependencies._generation
+
+            keys = set()
+            for table_name in table_names:
+                keys.update(CacheDependencies._keys_by_table.pop(table_name, ()))
+
+            for key in keys:
+                for table_name in CacheDependencies._tables_by_key.pop(key, ()):
+                    dependents = CacheDependencies._keys_by_table.get(table_name)
+                    if dependents is not None:
+                        dependents.discard(key)
+                        if not dependents:
+                            del CacheDependencies._keys_by_table[table_name]
+
+            return keys
+
+    @staticmethod
+    def get_tables(key: str) -> set[str]:
+        """Returns the tables the cached response of the key was read from"""
+        with CacheDependencies._lock:
+            return set(CacheDependencies._tables_by_key.get(key, ()))
+
+    @staticmethod
+    def clear() -> None:
+        with CacheDependencies._lock:
+            CacheDependencies._pending.clear()
+            CacheDependencies._keys_by_table.clear()
+            CacheDependencies._tables_by_key.clear()
+            CacheDependencies._started.clear()
+
+    @staticmethod
+    def _is_outdated(key: str) -> bool:
+        started = CacheDependencies._started.get(key)
+        if started is None:
+            return False
+
+        return any(
+            CacheDependencies._invalidated.get(table_name, 0) > started
+            for table_name in CacheDependencies._pending.get(key, ())
+        )
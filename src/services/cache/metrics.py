@@ -0,0 +1,129 @@
+"""
+On It Cache Service - CacheMetrics
+
+Counters of a cache tier, rendered in the Prometheus text format.
+"""
+
+import threading
+from collections import Counter
+
+
+class CacheMetrics:
+    """
+    Hits, misses, sets and evictions (by reason) of a cache tier, with the
+    hits and misses per key prefix: the key up to its last ':', e.g.
+    `select:Service` for the responses of `?select=Service`.
+    """
+
+    # Keys come from the requests: past this, prefixes are counted as "other"
+    max_prefixes = 256
+
+    def __init__(self, tier: str):
+        self.tier = tier
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.sets = 0
+            self.evictions: Counter = Counter()
+            self.prefix_hits: Counter = Counter()
+            self.prefix_misses: Counter = Counter()
+            self._prefixes: set[str] = set()
+
+    def hit(self, key) -> None:
+        with self._lock:
+            self.hits += 1
+            self.prefix_hits[self._prefix(key)] += 1
+
+    def miss(self, key) -> None:
+        with self._lock:
+            self.misses += 1
+            self.prefix_misses[self._prefix(key)] += 1
+
+    def set(self) -> None:
+        with self._lock:
+            self.sets += 1
+
+    def evict(self, reason: str, count: int = 1) -> None:
+        with self._lock:
+            self.evictions[reason] += count
+
+    def to_prometheus(self, gauges: dict | None = None, labels: dict | None = None) -> list[str]:
+        """
+        Returns the samples of the tier in the Prometheus text format, without
+        the HELP/TYPE lines (see CacheMetrics.render).
+        """
+        base = {"tier": self.tier, **(labels or {})}
+
+        with self._lock:
+            samples = [
+                ("onit_cache_hits_total", base, self.hits),
+                ("onit_cache_misses_total", base, self.misses),
+                ("onit_cache_sets_total", base, self.sets),
+            ]
+            samples += [
+                ("onit_cache_evictions_total", {**base, "reason": reason}, count)
+                for reason, count in sorted(self.evictions.items())
+            ]
+
+            for prefix in sorted(self._prefixes):
+                hits, misses = self.prefix_hits[prefix], self.prefix_misses[prefix]
+                prefix_labels = {**base, "prefix": prefix}
+                samples += [
+                    ("onit_cache_prefix_hits_total", prefix_labels, hits),
+                    ("onit_cache_prefix_misses_total", prefix_labels, misses),
+                    ("onit_cache_prefix_hit_ratio", prefix_labels, round(hits / (hits + misses), 4)),
+                ]
+
+        samples += [(name, base, value) for name, value in (gauges or {}).items()]
+
+        return [f"{name}{CacheMetrics._labels(sample_labels)} {value}" for name, sample_labels, value in samples]
+
+    @staticmethod
+    def render(lines: list[str]) -> str:
+        """Adds the HELP/TYPE lines to the samples of one or more tiers"""
+        described = set()
+        output = []
+
+        for line in sorted(lines, key=lambda line: line.split("{", 1)[0]):
+            name = line.split("{", 1)[0]
+            if name not in described and name in METRICS:
+                kind, description = METRICS[name]
+                output += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+                described.add(name)
+            output.append(line)
+
+        return "\n".join(output) + "\n"
+
+    def _prefix(self, key) -> str:
+        prefix = str(key).rpartition(":")[0]
+        if prefix not in self._prefixes:
+            if len(self._prefixes) >= CacheMetrics.max_prefixes:
+                prefix = "other"
+            self._prefixes.add(prefix)
+
+        return prefix
+
+    @staticmethod
+    def _labels(labels: dict) -> str:
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+METRICS = {
+    "onit_cache_hits_total": ("counter", "Lookups that found the key"),
+    "onit_cache_misses_total": ("counter", "Lookups that didn't find the key"),
+    "onit_cache_sets_total": ("counter", "Objects set on the cache"),
+    "onit_cache_evictions_total": ("counter", "Objects removed from the cache, by reason"),
+    "onit_cache_prefix_hits_total": ("counter", "Lookups that found the key, by key prefix"),
+    "onit_cache_prefix_misses_total": ("counter", "Lookups that didn't find the key, by key prefix"),
+    "onit_cache_prefix_hit_ratio": ("gauge", "Share of the lookups that found the key, by key prefix"),
+    "onit_cache_bytes": ("gauge", "Estimated memory held by the cached objects"),
+    "onit_cache_bytes_limit": ("gauge", "Storage threshold of the cache (Cache:ObjectCacheStorageThreshold)"),
+    "onit_cache_entries": ("gauge", "Objects on the cache"),
+}
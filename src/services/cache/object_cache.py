@@ -2,66 +2,210 @@
 On It Cache Service - ObjectCache
 
 Handles caching for complex objects.
+
+Every operation is O(1): the entries live in a dictionary, and the eviction
+policy (LRU or LFU) keeps its own ordering of the keys. Expiry is checked
+lazily when an entry is read, and expired entries that are never read again
+are removed by a periodic sweep.
+
+Entries are booked at their estimated memory footprint: encoded responses at
+their byte length, other objects with a bounded deep-size estimate.
 """
 
 import sys
+import threading
+from collections import OrderedDict
 from time import time
-from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from components.dataclasses import EncodedResponse
+from libs.memory import deep_sizeof
+from services.cache.metrics import CacheMetrics
 from services.configuration import ConfigurationService
 
 
+###############################################################################
+#                              EVICTION POLICIES                              #
+###############################################################################
+
+
+class LRUPolicy:
+    """Evicts the least recently used key"""
+
+    def __init__(self):
+        self._keys = OrderedDict()
+
+    def insert(self, key):
+        self._keys[key] = None
+
+    def touch(self, key):
+        self._keys.move_to_end(key)
+
+    def remove(self, key):
+        self._keys.pop(key, None)
+
+    def victim(self):
+        return next(iter(self._keys), None)
+
+    def clear(self):
+        self._keys.clear()
+
+
+class LFUPolicy:
+    """Evicts the least frequently used key, the least recent one among ties"""
+
+    def __init__(self):
+        self._frequencies = {}
+        self._buckets: dict[int, OrderedDict] = {}
+        self._min_frequency = 0
+
+    def insert(self, key):
+        self._frequencies[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_frequency = 1
+
+    def touch(self, key):
+        frequency = self._frequencies[key]
+        self._unlink(key, frequency)
+
+        self._frequencies[key] = frequency + 1
+        self._buckets.setdefault(frequency + 1, OrderedDict())[key] = None
+        if self._min_frequency == frequency and frequency not in self._buckets:
+            self._min_frequency = frequency + 1
+
+    def remove(self, key):
+        frequency = self._frequencies.pop(key, None)
+        if frequency is not None:
+            self._unlink(key, frequency)
+
+    def victim(self):
+        if not self._buckets:
+            return None
+
+        # Removals can empty the lowest bucket: only then the minimum is looked up
+        if self._min_frequency not in self._buckets:
+            self._min_frequency = min(self._buckets)
+
+        return next(iter(self._buckets[self._min_frequency]))
+
+    def clear(self):
+        self._frequencies.clear()
+        self._buckets.clear()
+        self._min_frequency = 0
+
+    def _unlink(self, key, frequency):
+        bucket = self._buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[frequency]
+
+
+###############################################################################
+#                                 OBJECT CACHE                                #
+###############################################################################
+
+
+class CacheEntry:
+    """An object on the cache with its expiry and size"""
+
+    __slots__ = ("value", "size", "timeout", "expires_at", "sliding")
+
+    def __init__(self, value, size, timeout, sliding=True):
+        self.value = value
+        self.size = size
+        self.timeout = timeout
+        self.sliding = sliding
+        self.expires_at = time() + timeout if timeout is not None else None
+
+    def expired(self, now) -> bool:
+        return self.expires_at is not None and now > self.expires_at
+
+    def refresh(self, now):
+        if self.sliding and self.timeout is not None:
+            self.expires_at = now + self.timeout
+
+
 class ObjectCache(BaseCache):
     """Handles caching for complex objects"""
 
+    policies = {
+        "LRU": LRUPolicy,
+        "LFU": LFUPolicy,
+    }
+    size_estimators = {}
+
     def __init__(self, params=None, *args, **kwargs):
-        self._cached_objects = {}
-        self._object_metadata = {}
+        self._entries: dict[str, CacheEntry] = {}
+        self._lock = threading.RLock()
         self.storage = 0
         self._timeout = 0
         self.storage_threshold = 0
+        self.sweep_interval = 0
+        self.policy_name = ""
+        self._policy = LRUPolicy()
+        self._next_sweep = 0.0
+        self.metrics = CacheMetrics(tier="l1")
 
         params = params or {}
         super().__init__(params)
 
-    def add(self, key, value, timeout=None, version=None):
+    ###########################################################################
+    #                              CACHE INTERFACE                            #
+    ###########################################################################
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
         """
-        Adds an object to the cache.
+        Adds an object to the cache, unless a live object has the key.
 
         Args:
             key (str): A hashed representation of the request.
             item (object): The object to be cached.
         """
-        if key in self._cached_objects:
-            return False
+        with self._lock:
+            if self._get_entry(key, time()) is not None:
+                return False
 
-        self.set(key, value, timeout, version)
-        return True
+            self.set(key, value, timeout, version)
+            return True
 
-    def set(self, key, value, timeout=None, version=None):
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
         """
         Sets an object on the cache.
 
         Args:
             key (str): A hashed representation of the request.
             item (object): The object to be cached.
+            timeout (int): Seconds to live. Defaults to Cache:ObjectCacheTimeout,
+                refreshed on every read. An explicit timeout is not refreshed.
+                None never expires, 0 isn't cached.
         """
-        # Provision storage for the new item
-        item_size = sys.getsizeof(value)
-
         if not self.storage_threshold:
             self._refresh_configuration()
 
-        if self.storage + item_size > self.storage_threshold:
-            self.remove_oldest_objects()
+        sliding = timeout is DEFAULT_TIMEOUT
+        if sliding:
+            timeout = self._timeout
+
+        item_size = ObjectCache.estimate_size(value)
+
+        with self._lock:
+            self._remove(key)
+            self.metrics.set()
+
+            # An object that can't fit would evict everything else for nothing
+            if timeout is not None and timeout <= 0:
+                return
+            if item_size > self.storage_threshold:
+                self.metrics.evict("oversize")
+                return
+
+            self._entries[key] = CacheEntry(value, item_size, timeout, sliding)
+            self._policy.insert(key)
+            self.storage += item_size
 
-        # Add the item to the cache
-        self._object_metadata[key] = {
-            "created_at": time(),
-            "expires_at": time() + self._timeout,
-            "size": item_size,
-        }
-        self._cached_objects[key] = value
-        self._update_storage(key, value)
+            if self.storage > self.storage_threshold:
+                self.remove_oldest_objects()
+
+            self._sweep()
 
     def get(self, key, default=None, version=None):
         """
@@ -73,15 +217,35 @@ class ObjectCache(BaseCache):
         Returns:
             object: The cached object.
         """
-        if not key in self._cached_objects:
-            return None
+        with self._lock:
+            now = time()
+            entry = self._get_entry(key, now)
+            if entry is None:
+                self.metrics.miss(key)
+                return default
 
-        self._reset_timeout(key)
+            self.metrics.hit(key)
+            entry.refresh(now)
+            self._policy.touch(key)
+            self._sweep()
 
-        return self._cached_objects.get(key, None)
+            return entry.value
 
-    def print_info(self):
-        print(f"Number of cached objects: {len(self._cached_objects)}")
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        """Sets a new timeout on an object. Returns False if it isn't cached."""
+        with self._lock:
+            entry = self._get_entry(key, time())
+            if entry is None:
+                return False
+
+            entry.timeout = self._timeout if timeout is DEFAULT_TIMEOUT else timeout
+            entry.expires_at = time() + entry.timeout if entry.timeout is not None else None
+
+            return True
+
+    def has_key(self, key, version=None):
+        with self._lock:
+            return self._get_entry(key, time()) is not None
 
     def delete(self, key, version=None):
         """
@@ -90,66 +254,185 @@ class ObjectCache(BaseCache):
         Args:
             key (str): A hashed representation of the request.
         """
-        self._cached_objects.pop(key, None)
-        item = self._object_metadata.pop(key, None)
-        self.storage -= item["size"]
+        with self._lock:
+            if self._remove(key) is None:
+                return False
+
+            self.metrics.evict("deleted")
+            return True
 
     def clear(self):
         """Clears the cache."""
-        self._cached_objects = {}
-        self._object_metadata = {}
-        self.storage = 0
+        with self._lock:
+            self.metrics.evict("cleared", len(self._entries))
+            self._entries = {}
+            self._policy.clear()
+            self.storage = 0
 
-    def _reset_timeout(self, key):
-        """
-        Resets the timeout for an object.
+    def get_many(self, keys, version=None):
+        return super().get_many(keys, version)
 
-        Args:
-            key (str): A hashed representation of the request.
-        """
-        self._object_metadata[key]["expires_at"] = time() + self._timeout
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return super().set_many(data, timeout, version)
 
-    def _update_storage(self, key, item=None):
+    ###########################################################################
+    #                              PUBLIC METHODS                             #
+    ###########################################################################
+
+    def configure(self, timeout=None, storage_threshold=None, policy=None, sweep_interval=None):
+        """
+        Configures the cache. Switching the policy re-seeds it with the cached
+        keys, so the cached objects are kept.
         """
-        Resets the timeout for an object.
+        with self._lock:
+            if timeout is not None:
+                self._timeout = int(timeout)
 
-        Args:
-            key (str): A hashed representation of the request.
+            if storage_threshold is not None:
+                self.storage_threshold = int(storage_threshold)
+
+            if sweep_interval is not None:
+                self.sweep_interval = int(sweep_interval)
+                self._next_sweep = time() + self.sweep_interval
+
+            if policy is not None and policy != self.policy_name:
+                if policy not in ObjectCache.policies:
+                    raise ValueError(f"Unknown eviction policy '{policy}'. Supported policies: {list(ObjectCache.policies)}")
+
+                self.policy_name = policy
+                self._policy = ObjectCache.policies[policy]()
+                for key in self._entries:
+                    self._policy.insert(key)
+
+            if self.storage > self.storage_threshold:
+                self.remove_oldest_objects()
+
+    @staticmethod
+    def register_size_estimator(value_type: type):
         """
-        item_size = sys.getsizeof(item)
-        self._object_metadata[key]["size"] = item_size
-        self.storage += item_size
+        Decorator to register the function measuring the cached objects of a type.
+        """
+        def decorator(estimator):
+            ObjectCache.size_estimators[value_type] = estimator
+            return estimator
+
+        return decorator
+
+    @staticmethod
+    def estimate_size(value) -> int:
+        """Returns the memory held by an object, as booked against the storage threshold"""
+        for value_type in type(value).__mro__:
+            if value_type in ObjectCache.size_estimators:
+                return ObjectCache.size_estimators[value_type](value)
+
+        return deep_sizeof(value)
+
+    def print_info(self):
+        print(f"Number of cached objects: {len(self._entries)}")
+        print(f"Used memory: {self.storage} ({self.storage_threshold})")
+        print(f"Hits: {self.metrics.hits}, misses: {self.metrics.misses}, evictions: {dict(self.metrics.evictions)}")
+
+    def get_metrics(self, labels=None) -> list[str]:
+        """Returns the metrics of the cache in the Prometheus text format"""
+        with self._lock:
+            gauges = {
+                "onit_cache_bytes": self.storage,
+                "onit_cache_bytes_limit": self.storage_threshold,
+                "onit_cache_entries": len(self._entries),
+            }
+
+        return self.metrics.to_prometheus(gauges, labels)
 
     def remove_expired_objects(self):
         """Removes objects that have expired."""
         current_time = time()
 
-        for key, value in self._object_metadata.items():
-            if current_time > value["expires_at"]:
-                self.delete(key)
+        with self._lock:
+            expired_keys = [key for key, entry in self._entries.items() if entry.expired(current_time)]
+            for key in expired_keys:
+                self._remove(key)
+
+            self.metrics.evict("expired", len(expired_keys))
 
     def remove_oldest_objects(self):
-        """Removes the oldest objects until the storage is below the threshold."""
+        """Evicts objects, as chosen by the policy, until the storage is below the threshold."""
         if not self.storage_threshold:
             self._refresh_configuration()
 
-        while self.storage > self.storage_threshold:
-            oldest_key = min(
-                self._object_metadata, key=lambda k: self._object_metadata[k]["created_at"]
-            )
-            self.delete(oldest_key)
+        with self._lock:
+            while self.storage > self.storage_threshold:
+                victim = self._policy.victim()
+                if victim is None:
+                    break
 
-    def _refresh_configuration(self):
-        """Refreshes the configuration."""
-        self._timeout = int(ConfigurationService.get_parameter(
-            category="Cache", key="ObjectCacheTimeout"
-        ) or '86400')
-        self.storage_threshold = int(ConfigurationService.get_parameter(
-            category="Cache", key="ObjectCacheStorageThreshold"
-        ) or '52428800')
+                self._remove(victim)
+                self.metrics.evict("capacity")
 
-    def get_many(self, keys, version=None):
-        return super().get_many(keys, version)
+    ###########################################################################
+    #                             PRIVATE METHODS                             #
+    ###########################################################################
 
-    def set_many(self, data, timeout=None, version=None):
-        return super().set_many(data, timeout, version)
+    @property
+    def timeout(self) -> int:
+        """The default time to live of the cached objects"""
+        if not self.storage_threshold:
+            self._refresh_configuration()
+
+        return self._timeout
+
+    def _get_entry(self, key, now):
+        """Returns the live entry of the key, dropping it if it has expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if entry.expired(now):
+            self._remove(key)
+            self.metrics.evict("expired")
+            return None
+
+        return entry
+
+    def _remove(self, key):
+        """Removes the entry of the key, returns it (None if there was none)"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._policy.remove(key)
+            self.storage -= entry.size
+
+        return entry
+
+    def _sweep(self):
+        """Removes the expired objects, at most once every sweep interval"""
+        if not self.sweep_interval:
+            return
+
+        now = time()
+        if now < self._next_sweep:
+            return
+
+        self._next_sweep = now + self.sweep_interval
+        self.remove_expired_objects()
+
+    def _refresh_configuration(self):
+        """Refreshes the configuration."""
+        self.configure(
+            timeout=ConfigurationService.get_parameter(
+                category="Cache", key="ObjectCacheTimeout"
+            ) or '86400',
+            storage_threshold=ConfigurationService.get_parameter(
+                category="Cache", key="ObjectCacheStorageThreshold"
+            ) or '52428800',
+            policy=ConfigurationService.get_parameter(
+                category="Cache", key="ObjectCacheEvictionPolicy"
+            ) or 'LRU',
+            sweep_interval=ConfigurationService.get_parameter(
+                category="Cache", key="ObjectCacheSweepInterval"
+            ) or '300',
+        )
+
+
+@ObjectCache.register_size_estimator(EncodedResponse)
+def encoded_response_size(response: EncodedResponse) -> int:
+    """Encoded responses are measured exactly: the body and the ETag"""
+    return sys.getsizeof(response) + sys.getsizeof(response.etag)
@@ -0,0 +1,246 @@
+"""
+On It Cache Service - CacheSnapshot
+
+Keeps the cached responses in a local SQLite file, so that a restarted (or
+scaled out) worker comes up warm without querying the database.
+
+    - Write behind: the keys set on the cache are written every interval
+    - Lazy load: a key missed by the cache is looked up in the snapshot
+    - Versioned: the snapshot is discarded when the schema specification,
+      the migrations or CACHE_SNAPSHOT_VERSION change
+    - Invalidated with the cache: table changes delete the responses read
+      from the table
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from time import sleep, time
+from django.conf import settings
+
+from components.dataclasses import EncodedResponse
+
+
+class CacheSnapshot:
+    """Persistent snapshot of the encoded responses on the cache"""
+
+    logger = logging.getLogger("django")
+    schema_path = "data/database_specifications/database_schema.json"
+    migrations_path = "api/migrations"
+
+    _lock = threading.RLock()
+    _connection = None
+    _pid = 0
+    _exit_handler = False
+    _dirty: set[str] = set()
+
+    ###########################################################################
+    #                              PUBLIC METHODS                             #
+    ###########################################################################
+
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, "CACHE_SNAPSHOT", False)
+
+    @staticmethod
+    def mark(key: str) -> None:
+        """Marks a key to be written with the next flush"""
+        if not CacheSnapshot.enabled():
+            return
+
+        with CacheSnapshot._lock:
+            CacheSnapshot._open()
+            CacheSnapshot._dirty.add(key)
+
+    @staticmethod
+    def restore(key: str, max_age: float):
+        """
+        Returns the encoded response of the key from the snapshot and the
+        tables it was read from, or None. Responses older than the max age
+        (the cache timeout) are ignored.
+        """
+        if not CacheSnapshot.enabled():
+            return None
+
+        with CacheSnapshot._lock:
+            row = CacheSnapshot._open().execute(
+                "SELECT body, etag, content_type, status, created_at, tables "
+                "FROM entries WHERE key = ? AND created_at > ?",
+                (key, time() - max_age)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        body, etag, content_type, status, created_at, tables = row
+        encoded = EncodedResponse(
+            body=body,
+            etag=etag,
+            content_type=content_type,
+            status=status,
+            created_at=created_at
+        )
+
+        return encoded, tables.split(",") if tables else []
+
+    @staticmethod
+    def flush(get_object, get_tables) -> int:
+        """
+        Writes the marked keys still on the cache. Returns the number written.
+
+        Args:
+            get_object (callable): Returns the cached object of a key.
+            get_tables (callable): Returns the tables a cached object was read from.
+        """
+        with CacheSnapshot._lock:
+            keys, CacheSnapshot._dirty = CacheSnapshot._dirty, set()
+
+        entries = []
+        for key in keys:
+            encoded = get_object(key)
+            if isinstance(encoded, EncodedResponse):
+                entries.append((key, encoded, sorted(get_tables(key))))
+
+        if not entries:
+            return 0
+
+        rows = [
+            (key, encoded.body, encoded.etag, encoded.content_type, encoded.status, encoded.created_at, ",".join(tables))
+            for key, encoded, tables in entries
+        ]
+
+        with CacheSnapshot._lock:
+            connection = CacheSnapshot._open()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO entries "
+                    "(key, body, etag, content_type, status, created_at, tables) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                connection.executemany("DELETE FROM entry_tables WHERE key = ?", [(key,) for key, _, _ in entries])
+                connection.executemany(
+                    "INSERT INTO entry_tables (key, table_name) VALUES (?, ?)",
+                    [(key, table_name) for key, _, tables in entries for table_name in tables]
+                )
+
+        return len(entries)
+
+    @staticmethod
+    def delete_tables(table_names) -> None:
+        """Deletes the responses read from the tables"""
+        if not CacheSnapshot.enabled():
+            return
+
+        placeholders = ",".join("?" * len(table_names))
+        with CacheSnapshot._lock:
+            connection = CacheSnapshot._open()
+            with connection:
+                keys = [row[0] for row in connection.execute(
+                    f"SELECT DISTINCT key FROM entry_tables WHERE table_name IN ({placeholders})", list(table_names)
+                )]
+                CacheSnapshot._dirty.difference_update(keys)
+                connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+                connection.executemany("DELETE FROM entry_tables WHERE key = ?", [(key,) for key in keys])
+
+    @staticmethod
+    def clear() -> None:
+        if not CacheSnapshot.enabled():
+            return
+
+        with CacheSnapshot._lock:
+            CacheSnapshot._dirty.clear()
+            connection = CacheSnapshot._open()
+            with connection:
+                connection.execute("DELETE FROM entries")
+                connection.execute("DELETE FROM entry_tables")
+
+    @staticmethod
+    def get_version() -> str:
+        """
+        The version stamp of the snapshot: the schema specification, the
+        migrations and CACHE_SNAPSHOT_VERSION (bumped for data changes made
+        outside the API, e.g. bulk loads).
+        """
+        stamp = hashlib.md5(str(getattr(settings, "CACHE_SNAPSHOT_VERSION", "")).encode("utf-8"))
+
+        with open(CacheSnapshot.schema_path, "rb") as file:
+            stamp.update(file.read())
+
+        if os.path.isdir(CacheSnapshot.migrations_path):
+            for name in sorted(os.listdir(CacheSnapshot.migrations_path)):
+                if name.endswith(".py"):
+                    stamp.update(name.encode("utf-8"))
+
+        return stamp.hexdigest()
+
+    ###########################################################################
+    #                             PRIVATE METHODS                             #
+    ###########################################################################
+
+    @staticmethod
+    def _open() -> sqlite3.Connection:
+        """
+        Opens the snapshot once per process (after the fork), discarding it if
+        its version stamp is outdated, and starts the flush thread.
+        """
+        if CacheSnapshot._pid == os.getpid():
+            return CacheSnapshot._connection
+
+        path = settings.CACHE_SNAPSHOT_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, body BLOB, etag TEXT, "
+                "content_type TEXT, status INTEGER, created_at REAL, tables TEXT)"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS entry_tables (key TEXT, table_name TEXT)")
+            connection.execute("CREATE INDEX IF NOT EXISTS entry_tables_table_name ON entry_tables (table_name)")
+            connection.execute("CREATE INDEX IF NOT EXISTS entry_tables_key ON entry_tables (key)")
+
+            version = CacheSnapshot.get_version()
+            row = connection.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or row[0] != version:
+                connection.execute("DELETE FROM entries")
+                connection.execute("DELETE FROM entry_tables")
+                connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)", (version,))
+
+        CacheSnapshot._connection = connection
+        CacheSnapshot._dirty = set()
+        CacheSnapshot._pid = os.getpid()
+
+        threading.Thread(target=CacheSnapshot._flush_periodically, name="cache-snapshot", daemon=True).start()
+
+        # Exit handlers are inherited by the forked workers: register it once
+        if not CacheSnapshot._exit_handler:
+            atexit.register(CacheSnapshot._flush_cache)
+            CacheSnapshot._exit_handler = True
+
+        return connection
+
+    @staticmethod
+    def _flush_cache():
+        from services.cache.cache import CacheService
+        from services.cache.dependencies import CacheDependencies
+
+        # Any error is logged: it must not stop the periodic flush thread
+        try:
+            CacheSnapshot.flush(CacheService.get_object, CacheDependencies.get_tables)
+        except Exception as error:
+            CacheSnapshot.logger.warning(f"Unable to write the cache snapshot: {error}")
+
+    @staticmethod
+    def _flush_periodically():
+        pid = os.getpid()
+        interval = getattr(settings, "CACHE_SNAPSHOT_INTERVAL", 60)
+
+        while CacheSnapshot._pid == pid:
+            sleep(interval)
+            CacheSnapshot._flush_cache()
@@ -0,0 +1,355 @@
+"""
+On It Cache Service - TieredCache
+
+Two cache tiers shared by the workers of a deployment:
+    - L1: the in-process ObjectCache of each worker
+    - L2: Redis, holding the encoded response bytes for every worker
+
+Deletions and refills are broadcast on a Redis channel, so every worker
+drops its L1 copy of a key together. The tables each shared response was
+read from are indexed on Redis too, next to the responses: a table change
+evicts them whichever worker filled them, even one restarted since. Without
+a Redis location the cache is the L1 alone.
+"""
+
+import logging
+import os
+import pickle
+import threading
+import uuid
+from contextlib import contextmanager
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+from components.dataclasses import EncodedResponse
+from services.cache.dependencies import CacheDependencies
+from services.cache.metrics import CacheMetrics
+from services.cache.object_cache import ObjectCache
+
+# Tells a miss from a cached None
+MISSING = object()
+
+
+class ProcessTiers:
+    """
+    The state of a cache shared by the threads of a process: Django gives
+    every thread its own backend instance (as LocMemCache shares _caches).
+    The L1, the Redis client and the invalidation listener are one per
+    process, started again in each forked worker.
+    """
+
+    def __init__(self, params):
+        self.local = ObjectCache(params)
+        self.metrics = CacheMetrics(tier="l2")
+        self.client = None
+        self.listener = None
+        self.pid = 0
+        self.sender = ""
+        self.lock = threading.Lock()
+
+
+# The tiers of each cache, by location and prefix
+_tiers: dict[tuple[str, str], ProcessTiers] = {}
+_tiers_lock = threading.Lock()
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is in requirements.txt
+    redis = None
+
+
+class TieredCache(BaseCache):
+    """In-process L1 in front of a shared Redis L2"""
+
+    logger = logging.getLogger("django")
+
+    def __init__(self, location="", params=None, *args, **kwargs):
+        params = params or {}
+        super().__init__(params)
+
+        options = params.get("OPTIONS", {})
+        self.prefix = options.get("PREFIX", "onit:cache")
+        self.channel = f"{self.prefix}:invalidate"
+        self.fill_timeout = options.get("FILL_TIMEOUT", 10)
+
+        with _tiers_lock:
+            tiers = _tiers.get((location, self.prefix))
+            if tiers is None:
+                tiers = _tiers[(location, self.prefix)] = ProcessTiers(params)
+
+        self._tiers = tiers
+        self.local = tiers.local
+        self.metrics = tiers.metrics
+        self._location = location
+
+    ###########################################################################
+    #                              CACHE INTERFACE                            #
+    ###########################################################################
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.has_key(key):
+            return False
+
+        self.set(key, value, timeout, version)
+        return True
+
+    def get(self, key, default=None, version=None):
+        """
+        Gets an object from L1, falling back on L2. Objects read from L2 are
+        kept on L1 for the next requests of the worker.
+        """
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        client = self.client
+        if client is None:
+            return default
+
+        try:
+            payload = client.get(self._key(key))
+        except redis.RedisError as error:
+            self.logger.warning(f"Cache L2 unavailable: {error}")
+            return default
+
+        if payload is None:
+            self.metrics.miss(key)
+            return default
+
+        self.metrics.hit(key)
+
+        value, timeout = pickle.loads(payload)
+        self.local.set(key, value, DEFAULT_TIMEOUT if timeout == "default" else timeout)
+
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Sets an object on L1. Encoded responses are also shared on L2, and the
+        other workers drop their L1 copy of the key.
+        """
+        self.local.set(key, value, timeout)
+
+        client = self.client
+        if client is None or not isinstance(value, EncodedResponse):
+            return
+
+        # The timeout travels with the value, so the other L1s expire it alike
+        shared_timeout = "default" if timeout is DEFAULT_TIMEOUT else timeout
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.local.timeout
+
+        try:
+            payload = pickle.dumps((value, shared_timeout), pickle.HIGHEST_PROTOCOL)
+            client.set(self._key(key), payload, ex=int(timeout) if timeout else None)
+            self.metrics.set()
+            self._broadcast(key)
+        except redis.RedisError as error:
+            self.logger.warning(f"Cache L2 unavailable: {error}")
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.local.touch(key, timeout)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING) is not MISSING
+
+    def delete(self, key, version=None):
+        """Deletes an object from every tier and every worker"""
+        deleted = self.local.delete(key)
+
+        client = self.client
+        if client is None:
+            return deleted
+
+        try:
+            deleted = bool(client.delete(self._key(key))) or deleted
+            self._broadcast(key)
+        except redis.RedisError as error:
+            self.logger.warning(f"Cache L2 unavailable: {error}")
+
+        return deleted
+
+    def clear(self):
+        """Clears every tier and every worker"""
+        self.local.clear()
+
+        client = self.client
+        if client is None:
+            return
+
+        try:
+            keys = list(client.scan_iter(match=f"{self.prefix}:key:*", count=500))
+            keys += client.scan_iter(match=f"{self.prefix}:table:*", count=500)
+            if keys:
+                client.delete(*keys)
+            self._broadcast("*")
+        except redis.RedisError as error:
+            self.logger.warning(f"Cache L2 unavailable: {error}")
+
+    ###########################################################################
+    #                              PUBLIC METHODS                             #
+    ###########################################################################
+
+    def set_dependencies(self, key, table_names):
+        """Indexes the tables a shared response was read from on L2"""
+        client = self.client
+        if client is None:
+            return
+
+        try:
+            with client.pipeline() as pipe:
+                for table_name in table_names:
+                    pipe.sadd(self._table_key(table_name), key)
+                pipe.execute()
+        except redis.RedisError as error:
+            self.logger.warning(f"Cache L2 unavailable: {error}")
+
+    def invalidate_tables(self, table_names):
+        """
+        Evicts the responses read from the tables, from every tier and every
+        worker. The keys are taken from the L2 index, which outlives the
+        workers that filled them, and from the index of this worker.
+        """
+        keys = CacheDependencies.pop_keys(table_names)
+        for key in keys:
+            self.local.delete(key)
+
+        client = self.client
+        if client is None or not table_names:
+            return
+
+        try:
+            # Read and drop the index at once, so that no response indexed in
+            # between is forgotten
+            with client.pipeline() as pipe:
+                for table_name in table_names:
+                    pipe.smembers(self._table_key(table_name))
+                pipe.delete(*[self._table_key(table_name) for table_name in table_names])
+                *members, _ = pipe.execute()
+
+            shared = {shared_key.decode("utf-8") for shared_keys in members for shared_key in shared_keys}
+            for key in shared - keys:
+                self.local.delete(key)
+            keys.update(shared)
+
+            if keys:
+                client.delete(*[self._key(key) for key in keys])
+            self._broadcast(keys=keys, tables=table_names)
+        except redis.RedisError as error:
+            self.logger.warning(f"Cache L2 unavailable: {error}")
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Single flight: one worker at a time fills a key, the others wait for
+        it and then find the key on L2. A fill that outlives the fill timeout
+        releases the key, and a waiter that times out fills it itself.
+        """
+        client = self.client
+        if client is None:
+            yield
+            return
+
+        fill_lock = client.lock(
+            f"{self.prefix}:fill:{key}",
+            timeout=self.fill_timeout,
+            blocking_timeout=self.fill_timeout
+        )
+
+        try:
+            acquired = fill_lock.acquire()
+        except redis.RedisError as error:
+            self.logger.warning(f"Cache L2 unavailable: {error}")
+            acquired = False
+
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    fill_lock.release()
+                except redis.RedisError:
+                    # Expired while filling: the lock is already gone
+                    pass
+
+    def print_info(self):
+        self.local.print_info()
+        if self.client is not None:
+            print(f"L2 hits: {self.metrics.hits}, misses: {self.metrics.misses}")
+
+    def get_metrics(self, labels=None) -> list[str]:
+        """Returns the metrics of both tiers in the Prometheus text format"""
+        lines = self.local.get_metrics(labels)
+        if self.client is not None:
+            lines += self.metrics.to_prometheus(labels=labels)
+
+        return lines
+
+    @property
+    def client(self):
+        """
+        The Redis client of the process, or None without a Redis location.
+        The client and the invalidation listener are (re)started here rather
+        than at import, so that each forked worker runs its own, once.
+        """
+        if not self._location or redis is None:
+            return None
+
+        tiers = self._tiers
+        if tiers.pid != os.getpid():
+            with tiers.lock:
+                if tiers.pid != os.getpid():
+                    tiers.client = redis.Redis.from_url(self._location)
+                    tiers.sender = uuid.uuid4().hex
+                    tiers.listener = threading.Thread(
+                        target=self._listen, args=(tiers.client,), name="cache-invalidation", daemon=True
+                    )
+                    tiers.listener.start()
+                    tiers.pid = os.getpid()
+
+        return tiers.client
+
+    ###########################################################################
+    #                             PRIVATE METHODS                             #
+    ###########################################################################
+
+    def _key(self, key):
+        return f"{self.prefix}:key:{key}"
+
+    def _table_key(self, table_name):
+        return f"{self.prefix}:table:{table_name}"
+
+    def _broadcast(self, key="", keys=(), tables=()):
+        """Publishes the key to drop, or the changed tables and their keys, to the other workers"""
+        sender = self._tiers.sender
+        if tables:
+            self.client.publish(self.channel, f"{sender}:tables:{','.join(tables)}:{','.join(keys)}")
+        else:
+            self.client.publish(self.channel, f"{sender}:key:{key}")
+
+    def _listen(self, client):
+        """Drops the L1 copies of the keys invalidated by the other workers"""
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+
+        try:
+            for message in pubsub.listen():
+                sender, kind, value = message["data"].decode("utf-8").split(":", 2)
+                if sender == self._tiers.sender:
+                    continue
+
+                if kind == "tables":
+                    # Local deletes only: the sender already evicted L2 and
+                    # told every worker
+                    tables, keys = value.split(":", 1)
+                    evicted = CacheDependencies.pop_keys(tables.split(","))
+                    evicted.update(filter(None, keys.split(",")))
+                    for key in evicted:
+                        self.local.delete(key)
+                elif value == "*":
+                    self.local.clear()
+                    CacheDependencies.clear()
+                else:
+                    self.local.delete(value)
+        except redis.RedisError as error:
+            self.logger.warning(f"Cache invalidation listener stopped: {error}")
+            self._tiers.pid = 0
@@ -0,0 +1,139 @@
+"""
+On It Cache Service - CacheWarmer
+
+Fills the cache before a worker accepts traffic, by replaying a manifest of
+canonical GET requests: the configured hot requests, followed by the most
+requested paths collected by the previous run of the server.
+
+Each worker merges the paths it served into the collected manifest when it
+exits (see gunicorn.conf.py): the manifest of a run is the sum of its workers.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from time import perf_counter
+from django.http import HttpRequest, QueryDict
+
+from components.dataclasses import ParsedRequest
+
+
+class CacheWarmer:
+    """Warms the cache up from a manifest of requests"""
+
+    logger = logging.getLogger("django")
+    manifest_path = "data/api_specifications/warmup_manifest.json"
+    collected_path = "data/cache/collected_manifest.json"
+
+    # Bounded: once full, only the paths already counted are counted
+    max_collected = 10_000
+    _hits: Counter = Counter()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(parsed: ParsedRequest) -> None:
+        """Counts a GET request, for the manifest of the next process"""
+        path = parsed.canonical_path
+        with CacheWarmer._lock:
+            if path in CacheWarmer._hits or len(CacheWarmer._hits) < CacheWarmer.max_collected:
+                CacheWarmer._hits[path] += 1
+
+    @staticmethod
+    def save_collected(top_n: int = 100) -> None:
+        """
+        Merges the most requested paths of this process into the collected
+        manifest. The counts left by the workers of a previous run (another
+        CACHE_WARMUP_RUN) are replaced rather than added to.
+        """
+        with CacheWarmer._lock:
+            hits, CacheWarmer._hits = CacheWarmer._hits, Counter()
+
+        if not hits:
+            return
+
+        run = os.environ.get("CACHE_WARMUP_RUN", "")
+        os.makedirs(os.path.dirname(CacheWarmer.collected_path), exist_ok=True)
+
+        # The workers exit together: one at a time reads and writes the file
+        with open(CacheWarmer.collected_path, 'a+') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            file.seek(0)
+            try:
+                collected = json.load(file)
+            except ValueError:
+                collected = {}
+
+            if isinstance(collected, dict) and collected.get("run") == run:
+                hits.update(collected.get("hits", {}))
+
+            file.seek(0)
+            file.truncate()
+            json.dump({"run": run, "hits": dict(hits.most_common(top_n))}, file, indent=2)
+
+    @staticmethod
+    def get_manifest(top_n: int = 100) -> list[str]:
+        """Returns the configured paths, then the collected ones, without repeats"""
+        paths = []
+        for manifest_path in (CacheWarmer.manifest_path, CacheWarmer.collected_path):
+            if not os.path.exists(manifest_path):
+                continue
+
+            with open(manifest_path, 'r') as file:
+                manifest = json.load(file)
+
+            # The collected manifest counts the hits of every path
+            if isinstance(manifest, dict):
+                manifest = [path for path, _ in Counter(manifest.get("hits", {})).most_common()]
+            paths.extend(manifest)
+
+        return list(dict.fromkeys(paths))[:top_n]
+
+    @staticmethod
+    def warm_up(paths: list[str] | None = None) -> list[dict]:
+        """
+        Replays the paths through the GET view, which fills the cache.
+
+        Returns:
+            list[dict]: The path, status and duration (ms) of every request.
+        """
+        from services.rest import RestService
+
+        paths = CacheWarmer.get_manifest() if paths is None else paths
+        report = []
+        start = perf_counter()
+
+        for path in paths:
+            request = HttpRequest()
+            request.method = "GET"
+            request.path, _, query = path.partition("?")
+            request.GET = QueryDict(query)
+
+            request_start = perf_counter()
+            try:
+                with RestService.open_request(request) as request_context:
+                    view = RestService.get_view(request_context)
+                    status = view(request_context).status_code
+            except Exception as error:
+                CacheWarmer.logger.warning(f"Cache warm-up of {path} failed: {error}")
+                status = 500
+
+            report.append({
+                "path": path,
+                "status": status,
+                "duration (ms)": round((perf_counter() - request_start) * 1000, 1),
+            })
+
+        # The replayed requests are not traffic: they are left out of the manifest
+        with CacheWarmer._lock:
+            CacheWarmer._hits.clear()
+
+        CacheWarmer.logger.info(
+            f"Cache warm-up: {len(paths)} requests in {(perf_counter() - start) * 1000:.0f} ms"
+        )
+        for entry in report:
+            CacheWarmer.logger.info(f"  {entry['status']} {entry['duration (ms)']:>8} ms  {entry['path']}")
+
+        return report
@@ -61,6 +61,7 @@ class CommunicationService:
         recipient_list = [
             user.email for group in groups for user in group.user_set.all()
         ]
+        onitdb.group.clear_queryset("Notification:New:Enquiry")
 
         # Send the email
         subject = configuration.get("subject", "")
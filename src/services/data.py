@@ -1,10 +1,10 @@
 import json
 
-from django.core.cache import cache
+from components.dataclasses import RequestContext
 from components.sources import Source
 from libs.discovery import load_registered_implementations
+from libs.tracing import traced
 from services import Service
-from services.rest import RestService
 
 class DataService(Service):
     """
@@ -20,13 +20,17 @@ class DataService(Service):
     sources = {}
 
     @staticmethod
-    def source_manager(command) -> Source:
+    def get_commands() -> dict:
         if not DataService.commands:
             commands_path = "data/api_specifications/commands.json"
             with open(commands_path, 'r') as file:
                 DataService.commands = json.load(file)
 
-        if command not in DataService.commands:
+        return DataService.commands
+
+    @staticmethod
+    def source_manager(command) -> Source:
+        if command not in DataService.get_commands():
             raise ValueError(f"Request to '{command}' unknown. The following commands are supported: {list(DataService.commands.keys())}")
 
         source_label = DataService.commands[command]
@@ -57,19 +61,10 @@ class DataService(Service):
     ###########################################################################
 
     @staticmethod
-    def fetch_data(request_key: str):
-        data = cache.get(request_key)
-        if data:
-            return data
-
+    @traced("fetch")
+    def fetch_data(request_context: RequestContext):
         # Get data source
-        command = RestService.get_command(request_key)
-        data_source = DataService.source_manager(command)
-
-        # Retrieve the data
-        data = data_source.fetch(request_key)
-
-        # Cache and return
-        cache.set(request_key, data)
+        data_source = DataService.source_manager(request_context.parsed.command)
 
-        return data
\ No newline at end of file
+        # Retrieve the data (the encoded response is cached by the GET view)
+        return data_source.fetch(request_context)
\ No newline at end of file
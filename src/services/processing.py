@@ -2,6 +2,7 @@
 
 from components.processors import Processor
 from libs.discovery import load_registered_implementations
+from libs.tracing import traced
 from services import Service
 
 class TransformationService(Service):
@@ -29,9 +30,12 @@ class TransformationService(Service):
     @staticmethod
     def register_processor(label):
         """
-        Decorator to register a processor class.
+        Decorator to register a processor class. Its transformations are
+        traced under the label.
         """
         def decorator(cls):
-            TransformationService.processors[label] = cls()
+            processor = cls()
+            processor.transform = traced(label)(processor.transform)
+            TransformationService.processors[label] = processor
             return cls
         return decorator
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+On It Query Budget Service
+
+Checks the SQL queries of a request against the budgets declared in
+data/api_specifications/query_budgets.json:
+    - requests: the most queries of a request (e.g. "select:Service")
+    - processors: the most queries of one call of a processor (e.g. "Get:Service")
+
+Queries repeated by a processor (N+1) are reported too. Overruns are logged
+with QUERY_BUDGETS, or raised with QUERY_BUDGET_STRICT (e.g. in the tests).
+"""
+
+import json
+import logging
+from django.conf import settings
+
+from components.dataclasses import RequestContext
+from libs.tracing import Trace
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a request or processor runs more queries than its budget"""
+
+
+class QueryBudgetService:
+    """Checks the queries of the requests against their budgets"""
+
+    logger = logging.getLogger("django")
+    budgets: dict = {}
+
+    @staticmethod
+    def get_budgets() -> dict:
+        if not QueryBudgetService.budgets:
+            config_path = "data/api_specifications/query_budgets.json"
+            with open(config_path, 'r') as file:
+                QueryBudgetService.budgets = json.load(file)
+
+        return QueryBudgetService.budgets
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """Whether the queries of the requests are checked against their budgets"""
+        return getattr(settings, "QUERY_BUDGETS", False) or getattr(settings, "QUERY_BUDGET_STRICT", False)
+
+    @staticmethod
+    def check(request_context: RequestContext, request_trace: Trace) -> list[str]:
+        """
+        Method to check the queries of a traced request. Returns the budget
+        overruns, after logging them (or raising QueryBudgetExceeded in
+        strict mode). N+1 queries are logged as warnings.
+        """
+        budgets = QueryBudgetService.get_budgets()
+        parsed = request_context.parsed
+        request_label = f"{parsed.command}:{'-'.join(parsed.targets)}"
+
+        for name, shape, count in request_trace.repeated_queries(budgets.get("repeat_threshold", 5)):
+            QueryBudgetService.logger.warning(
+                f"N+1 queries in {name or request_label}: {count} x {shape}"
+            )
+
+        overruns = []
+
+        budget = budgets.get("requests", {}).get(request_label)
+        if budget is not None and request_trace.queries > budget:
+            overruns.append(f"{request_label} ran {request_trace.queries} queries (budget: {budget})")
+
+        for name, budget in budgets.get("processors", {}).items():
+            queries = request_trace.max_queries(name)
+            if queries > budget:
+                overruns.append(f"{name} ran {queries} queries in one call (budget: {budget})")
+
+        if overruns and getattr(settings, "QUERY_BUDGET_STRICT", False):
+            raise QueryBudgetExceeded("; ".join(overruns))
+
+        for overrun in overruns:
+            QueryBudgetService.logger.warning(f"Query budget exceeded: {overrun}")
+
+        return overruns
@@ -7,145 +7,132 @@ Handles REST API requests
 import json
 import hashlib
 import logging
-import sys
-from django.http import HttpRequest, JsonResponse
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from components.dataclasses import EncodedResponse, ParsedRequest, RequestContext
+from components.processors.query import Query
+from libs.tracing import Trace, traced
 
 
 class RestService():
     """Handles REST API requests"""
 
-    requests: dict[str, HttpRequest] = {}
     views = {}
     logger = logging.getLogger("django")
     control_parameters = []
+    ignored_parameters = {"prefixes": [], "names": []}
+
+    @staticmethod
+    def open_request(request: HttpRequest) -> RequestContext:
+        """
+        Parses the request into a request context. The context is not stored
+        on the service, it lives until the response is sent.
+        """
+        return RequestContext(parsed=RestService.parse_request(request), request=request)
 
     @staticmethod
-    def remove_request(request_key: str):
-        """Method to remove a request"""
-        RestService.requests.pop(request_key, None)
+    def parse_request(request: HttpRequest) -> ParsedRequest:
+        """
+        Parses the request once: the command, its targets, the filters fitted
+        by the query builder and the endpoint context. Sources and processors
+        read the parsed request instead of parsing the query string again.
+
+        Non-semantic parameters (tracking, cache busters) are dropped, so they
+        neither become the command nor change the cache key.
+        """
+        parameters = [
+            (key.strip(), value.strip())
+            for key, value in request.GET.items()
+            if not RestService.is_ignored_parameter(key)
+        ]
+
+        command = parameters[0][0] if parameters else ""
+        target = parameters[0][1] if parameters else ""
+        endpoint = request.path.strip('/')
+        endpoint_context = request.GET.get('with_context')
+
+        query_parameters = tuple(sorted(
+            (key, value)
+            for key, value in parameters[1:]
+            if key not in RestService.control_parameters
+        ))
+
+        return ParsedRequest(
+            method=request.method or "",
+            endpoint=endpoint,
+            command=command,
+            targets=tuple(target.split('-')) if target else (),
+            query_parameters=query_parameters,
+            filters=Query.get_builder().fit(dict(query_parameters)),
+            endpoint_context=endpoint_context,
+            cache_key=RestService.hash_request(endpoint, command, target, query_parameters, endpoint_context)
+        )
 
     @staticmethod
     def error_response(error, status: int = 400):
         """Method to return an error response"""
         return JsonResponse({
             'success': False,
-            'message': error,
+            'message': str(error),
         }, status=status)
 
-    @staticmethod
-    def get_context(request_key: str):
-        """Gets the endpoint_context from the request path"""
-        request = RestService.requests.get(request_key)
-        if not request:
-            raise ValueError("Unknown request. See docs for supported endpoints.")
-
-        return request.GET.get('with_context')
-
     @staticmethod
     def get_token(request: HttpRequest):
         """Method to get the CSRF token"""
         return JsonResponse({'csrf_token': get_token(request)})
 
-    @staticmethod
-    def get_endpoint(request_key: str) -> str:
-        """Method to get the endpoint"""
-        request = RestService.requests.get(request_key)
-        if request is None:
-            raise ValueError("Unknown request. See docs for supported endpoints.")
-
-        return request.path.strip('/')
-
-    @staticmethod
-    def get_command(request_key: str) -> str:
-        """Gets the command of the request. Command is always the first item in the """
-        request = RestService.requests.get(request_key)
-        if not request:
-            raise ValueError("Unknown request. See docs for supported endpoints.")
-
-        # Return the first query parameter which is the command by design
-        return next(iter(request.GET))
-
-    @staticmethod
-    def get_command_target(request_key: str):
-        request = RestService.requests.get(request_key)
-        if not request:
-            raise ValueError("Unknown request. See docs for supported endpoints.")
-
-        command = RestService.get_command(request_key)
-        return request.GET[command]
-
     @staticmethod
     def get_control_parameters():
         config_path = "data/api_specifications/control_parameters.json"
         with open(config_path, 'r') as file:
             RestService.control_parameters = json.load(file)
 
+        config_path = "data/api_specifications/ignored_parameters.json"
+        with open(config_path, 'r') as file:
+            RestService.ignored_parameters = json.load(file)
+
     @staticmethod
-    def hash_request(request: HttpRequest):
+    def is_ignored_parameter(key: str) -> bool:
+        """Method to determine if a parameter has no meaning to the API (e.g. utm_source)"""
+        ignored = RestService.ignored_parameters
+        return key in ignored["names"] or key.startswith(tuple(ignored["prefixes"]))
+
+    @staticmethod
+    def hash_request(endpoint, command, target, query_parameters, endpoint_context=None):
         """
         Method to get the hash
 
-        The hash is generated based on the target table, starting table,
-        and query parameters.
+        The hash is generated based on the endpoint, command, target tables,
+        query parameters and context. The parameters are sorted, so the order
+        in which they appear in the URL does not change the key. The key is
+        prefixed with the command and target (e.g. `select:Service:<hash>`),
+        which groups the cache metrics by target.
 
         Returns:
             str: The hashed key.
         """
         hash_object = hashlib.md5(json.dumps(
-            obj=request.get_full_path()).encode('utf-8')
-        )
-        request_key = hash_object.hexdigest()
-
-        if request_key in RestService.requests:
-            return request_key
-
-        RestService.requests[request_key] = request
-
-        return request_key
-
-    @staticmethod
-    def get_query_parmeters(request_key: str):
-        """Method to get the query parameters"""
-        request = RestService.requests.get(request_key)
-        if request is None:
-            raise ValueError("Unknown request. See docs for supported endpoints.")
-
-        command = RestService.get_command(request_key)
-        return {
-            key: value
-            for key, value in request.GET.items() if key not in [command, *RestService.control_parameters]
-        }
-
-    @staticmethod
-    def get_request(request_key: str) -> HttpRequest:
-        """Returns a specific request"""
-        request = RestService.requests.get(request_key)
-        if request is None:
-            raise ValueError("Unknown request. See docs for supported endpoints.")
+            obj=[endpoint, command, target, sorted(query_parameters), endpoint_context]
+        ).encode('utf-8'))
 
-        return RestService.requests[request_key]
+        return f"{command}:{target}:{hash_object.hexdigest()}"
 
     @staticmethod
-    def get_request_body(request_key: str):
-        """Method to get the request body"""
-        request = RestService.requests.get(request_key)
-        if request is None:
-            raise ValueError("Unknown request. See docs for supported endpoints.")
-
-        return request.body.decode('utf-8')
-
-    @staticmethod
-    def get_view(request_key: str):
+    def get_view(request_context: RequestContext):
         """Method to get the view"""
-        if RestService._is_token_endpoint(request_key):
+        if RestService._is_token_endpoint(request_context):
             return RestService.views['TOKEN:CSRF']
 
-        request = RestService.requests.get(request_key)
-        if request is None:
+        method = request_context.parsed.method
+        if method not in RestService.views:
             raise ValueError("Unknown request. See docs for supported endpoints.")
 
-        return RestService.views[request.method]
+        return RestService.views[method]
 
     @staticmethod
     def register_view(label):
@@ -159,22 +146,84 @@ class RestService():
         return decorator
 
     @staticmethod
-    def response(request_key, data):
+    @traced("response")
+    def response(request_context: RequestContext, data):
         """Method to return a response"""
-        endpoint = RestService.get_endpoint(request_key)
-        entities = RestService.get_query_parmeters(request_key)
+        return RestService.encoded_response(RestService.encode_response(request_context, data))
 
-        return JsonResponse({
+    @staticmethod
+    @traced("encode")
+    def encode_response(request_context: RequestContext, data) -> EncodedResponse:
+        """
+        Method to encode the response envelope once. The encoded response is
+        what is cached, so a cache hit is served without serializing again.
+        """
+        endpoint = request_context.parsed.endpoint
+        encoded_data = json.dumps(data, cls=DjangoJSONEncoder)
+
+        envelope = json.dumps({
             "message": f"{endpoint.title()} request processed succesfully",
             "status": 200,
             "endpoint": endpoint,
             "results": len(data) if data and isinstance(data, list) else 0,
-            "size (bytes)": sys.getsizeof(data),
-            "query parameters": entities,
-            "data": data
-        })
+            "size (bytes)": len(encoded_data),
+            "query parameters": dict(request_context.parsed.query_parameters),
+        }, cls=DjangoJSONEncoder)
+
+        # Splice the encoded data into the envelope rather than encoding it twice
+        body = f'{envelope[:-1]}, "data": {encoded_data}}}'.encode('utf-8')
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+
+        return EncodedResponse(body=body, etag=etag)
+
+    @staticmethod
+    def encoded_response(encoded: EncodedResponse) -> HttpResponse:
+        """Method to return a response from an encoded response"""
+        response = HttpResponse(encoded.body, content_type=encoded.content_type, status=encoded.status)
+        response["ETag"] = encoded.etag
+        response["Last-Modified"] = http_date(encoded.created_at)
+
+        return response
+
+    @staticmethod
+    def is_tracing() -> bool:
+        """Whether the time spent per stage of the requests is reported"""
+        return getattr(settings, "REQUEST_TRACING", False) or getattr(settings, "REQUEST_TRACING_LOG", False)
+
+    @staticmethod
+    def report_trace(request_context: RequestContext, request_trace: Trace, response: HttpResponse) -> None:
+        """
+        Method to report the time spent per stage of the request: as a
+        Server-Timing header (REQUEST_TRACING) and as a JSON log line
+        (REQUEST_TRACING_LOG).
+        """
+        if getattr(settings, "REQUEST_TRACING", False):
+            response["Server-Timing"] = request_trace.server_timing()
+
+        if getattr(settings, "REQUEST_TRACING_LOG", False):
+            RestService.logger.info(json.dumps({
+                "path": request_context.parsed.canonical_path,
+                "status": response.status_code,
+                **request_trace.to_dict(),
+            }))
+
+    @staticmethod
+    def conditional_response(request_context: RequestContext, encoded: EncodedResponse) -> HttpResponse:
+        """
+        Method to return a response from an encoded response, or a 304 when the
+        client's If-None-Match / If-Modified-Since shows it already has it.
+        """
+        response = RestService.encoded_response(encoded)
+
+        request = request_context.request
+        if request is None:
+            return response
+
+        return get_conditional_response(
+            request, etag=encoded.etag, last_modified=int(encoded.created_at), response=response
+        )
 
     @staticmethod
-    def _is_token_endpoint(request_key: str):
+    def _is_token_endpoint(request_context: RequestContext):
         """Method to determine if the endpoint is a token endpoint"""
-        return RestService.get_endpoint(request_key) == 'get-csrf-token'
+        return request_context.parsed.endpoint == 'get-csrf-token'